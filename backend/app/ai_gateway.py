@@ -7,12 +7,20 @@ Integration guide:
   1. Place your YOLOv8/TFLite model file in assets/models/
   2. Replace the function body below with actual inference code
   3. Optionally accept image_bytes as a parameter for real detection
+
+Request handlers go through InferenceEngine, which micro-batches concurrent
+requests and runs the model off the event loop in a worker pool.
 """
 
+import asyncio
+import logging
 import random
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 
 # ── Severity thresholds ───────────────────────────────────────────────────────
 
@@ -51,6 +59,21 @@ def generate_mock_confidence_score() -> float:
     )
 
 
+def predict_confidence_batch(
+    hazard_types: List[str], images: Optional[List[Optional[memoryview]]] = None,
+) -> List[float]:
+    """
+    Scores a whole batch in one model call. Runs in an InferenceEngine worker,
+    never on the event loop. images holds the encoded frame for each item
+    (or None), as memoryviews over the upload buffers — decode from them
+    directly rather than copying to bytes.
+
+    TODO: With a real model, pass the batch of frames to a single
+    model.predict(source=[...]) call instead of scoring one by one.
+    """
+    return [generate_mock_confidence_score() for _ in hazard_types]
+
+
 def determine_severity(hazard_type: str, confidence_score: float) -> str:
     """
     Determines severity level from hazard type and confidence score.
@@ -78,8 +101,158 @@ def determine_severity(hazard_type: str, confidence_score: float) -> str:
 def analyse_hazard(hazard_type: str) -> Tuple[float, str]:
     """
     Main entry point: returns (confidence_score, severity_level).
-    Called by the report-hazard endpoint.
+    Synchronous; request handlers use analyse_hazard_async instead.
     """
     confidence = generate_mock_confidence_score()
     severity = determine_severity(hazard_type, confidence)
     return confidence, severity
+
+
+def analyse_hazards(
+    hazard_types: List[str], images: Optional[List[Optional[memoryview]]] = None,
+) -> List[Tuple[float, str]]:
+    """
+    Batch entry point: returns (confidence_score, severity_level) per item,
+    in input order.
+    """
+    confidences = predict_confidence_batch(hazard_types, images)
+    return [
+        (confidence, determine_severity(hazard_type, confidence))
+        for hazard_type, confidence in zip(hazard_types, confidences)
+    ]
+
+
+# ── Batched Inference Engine ──────────────────────────────────────────────────
+
+class InferenceEngine:
+    """
+    Micro-batches concurrent analyse requests and runs each batch in a
+    worker pool. A batch closes when it reaches max_batch_size or when
+    max_wait_ms has passed since its first request, whichever comes first.
+    Callers await a future that resolves to (confidence_score, severity_level).
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float, workers: int):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="inference",
+        )
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Inference engine started — batch {self.max_batch_size}, "
+            f"wait {self.max_wait_ms}ms, workers {self.workers}"
+        )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # Fail anything still waiting so callers don't hang
+        while not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Inference engine stopped"))
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        logger.info("Inference engine stopped")
+
+    async def submit(
+        self, hazard_type: str, image: Optional[memoryview] = None,
+    ) -> Tuple[float, str]:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((hazard_type, image, future))
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[str, Optional[memoryview], asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000.0
+        try:
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # Already off the queue, so stop() can't fail these for us
+            self._fail_stopped(batch)
+            raise
+        return batch
+
+    @staticmethod
+    def _fail_stopped(batch: List[Tuple[str, Optional[memoryview], asyncio.Future]]) -> None:
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(RuntimeError("Inference engine stopped"))
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            hazard_types = [hazard_type for hazard_type, _, _ in batch]
+            images = [image for _, image, _ in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, analyse_hazards, hazard_types, images,
+                )
+            except asyncio.CancelledError:
+                self._fail_stopped(batch)
+                raise
+            except Exception as e:
+                logger.error(f"Inference batch of {len(batch)} failed: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+# Global singleton
+inference_engine = InferenceEngine(
+    max_batch_size=settings.inference_max_batch_size,
+    max_wait_ms=settings.inference_max_wait_ms,
+    workers=settings.inference_workers,
+)
+
+
+async def analyse_hazard_async(
+    hazard_type: str, image: Optional[memoryview] = None,
+) -> Tuple[float, str]:
+    """
+    Awaitable analyse_hazard used by request handlers. Goes through the
+    batched inference engine when it is running, inline otherwise.
+    """
+    if inference_engine.running:
+        return await inference_engine.submit(hazard_type, image)
+    return analyse_hazards([hazard_type], [image])[0]
+
+
+async def analyse_hazards_async(hazard_types: List[str]) -> List[Tuple[float, str]]:
+    """Awaitable analyse_hazards; items share engine batches with other requests."""
+    if inference_engine.running:
+        return list(await asyncio.gather(
+            *(inference_engine.submit(hazard_type) for hazard_type in hazard_types)
+        ))
+    return analyse_hazards(hazard_types)
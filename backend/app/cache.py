@@ -0,0 +1,355 @@
+"""
+SmartCity Dash - In-Process Caches
+Bounded TTL + LRU caches with hit/miss accounting.
+"""
+
+import hashlib
+import math
+import time
+from collections import OrderedDict, deque
+from typing import (
+    AbstractSet, Any, Callable, Deque, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar,
+)
+
+from app.config import settings
+from app.geo import (
+    geohash_center, geohash_encode, geohash_half_diagonal_m, haversine_m, tile_fraction,
+)
+from app.hazard_index import matches_filters, nearest_first
+
+
+V = TypeVar("V")
+
+MISSING = object()
+
+
+class TTLCache(Generic[V]):
+    """
+    Least-recently-used cache whose entries also expire after ttl_seconds.
+    Not thread-safe; intended for use from the event loop only.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, MISSING)
+        if entry is MISSING:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        if self._data.pop(key, MISSING) is not MISSING:
+            self.invalidations += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable, V], bool]) -> int:
+        """Drop every entry for which predicate(key, value) holds; returns the count."""
+        doomed = [k for k, (_, v) in self._data.items() if predicate(k, v)]
+        for k in doomed:
+            del self._data[k]
+        self.invalidations += len(doomed)
+        return len(doomed)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class VersionedTTLCache(TTLCache[V]):
+    """
+    TTLCache whose read-through fills can't overwrite a newer write.
+
+    Every set or pop bumps the generation and records it against the key.
+    A reader takes the generation before fetching and passes it to set();
+    if that key was written in the meantime the stale fill is dropped, as
+    with NearbyHazardsCache.set(generation=).
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        super().__init__(max_entries, ttl_seconds)
+        self.generation = 0
+        # key → generation of its last write, for the most recently written keys
+        self._written: "OrderedDict[Hashable, int]" = OrderedDict()
+        # Generation of the newest write forgotten from _written; fills taken
+        # before it are refused, since their key may have been written since
+        self._floor = 0
+
+    def _bump(self, key: Hashable) -> None:
+        self.generation += 1
+        self._written[key] = self.generation
+        self._written.move_to_end(key)
+        while len(self._written) > self.max_entries:
+            _, forgotten = self._written.popitem(last=False)
+            self._floor = forgotten
+
+    def set(
+        self, key: Hashable, value: V, ttl_seconds: Optional[float] = None,
+        generation: Optional[int] = None,
+    ) -> None:
+        if generation is not None and (
+            generation < self._floor or self._written.get(key, 0) > generation
+        ):
+            return
+        self._bump(key)
+        super().set(key, value, ttl_seconds)
+
+    def pop(self, key: Hashable) -> None:
+        self._bump(key)
+        super().pop(key)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._floor = self.generation
+        self._written.clear()
+        super().clear()
+
+
+# ── Nearby Hazards Tile Cache ─────────────────────────────────────────────────
+
+# Request radii are rounded up to one of these (km) so nearby drivers share keys
+RADIUS_BUCKETS_KM = (0.5, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0)
+
+TileKey = Tuple[str, float]
+
+# (centre_lat, centre_lon, coverage_radius_m, rows)
+TileEntry = Tuple[float, float, float, List[Dict[str, Any]]]
+
+# Recent invalidation points remembered for checking racing fills
+INVALIDATION_LOG_SIZE = 1024
+
+
+class NearbyHazardsCache:
+    """
+    Caches radius-query results per (geohash tile, radius bucket).
+
+    Each entry holds every hazard within radius bucket + the tile's half
+    diagonal of the tile centre, so any request centred inside the tile with
+    a radius up to the bucket can be answered by filtering the entry.
+
+    Tiles grow with the radius bucket, from geohash precision `precision` for
+    small radii to cells about half the bucket across for large ones, so wide
+    queries don't fill thousands of near-identical entries.
+    """
+
+    def __init__(self, precision: int, max_entries: int, ttl_seconds: float):
+        self.precision = precision
+        self._cache: TTLCache[TileEntry] = TTLCache(max_entries, ttl_seconds)
+        # Coarsest precision whose cells are at most half the bucket across
+        # (measured at the equator, where cells are widest)
+        self.precisions: Dict[float, int] = {
+            bucket: next(
+                (p for p in range(1, precision) if
+                 geohash_half_diagonal_m(geohash_encode(0.0, 0.0, p)) <= bucket * 500.0),
+                precision,
+            )
+            for bucket in RADIUS_BUCKETS_KM
+        }
+        # Bumped on every invalidation; fills taken before an invalidation
+        # are dropped if their coverage holds its point
+        self.generation = 0
+        # (generation, latitude, longitude) of the latest invalidations
+        self._invalidated: Deque[Tuple[int, float, float]] = deque()
+        # Generation of the newest invalidation forgotten from _invalidated;
+        # fills taken before it are refused outright
+        self._floor = 0
+
+    @staticmethod
+    def radius_bucket(radius_km: float) -> Optional[float]:
+        for bucket in RADIUS_BUCKETS_KM:
+            if radius_km <= bucket:
+                return bucket
+        return None
+
+    def tile_query(
+        self, latitude: float, longitude: float, radius_km: float,
+    ) -> Optional[Tuple[TileKey, float, float, float]]:
+        """
+        Return (key, centre_lat, centre_lon, fetch_radius_km) for the tile
+        covering this request, or None if the radius is too large to cache.
+        """
+        bucket = self.radius_bucket(radius_km)
+        if bucket is None:
+            return None
+        tile = geohash_encode(latitude, longitude, self.precisions[bucket])
+        clat, clon = geohash_center(tile)
+        fetch_km = bucket + geohash_half_diagonal_m(tile) / 1000.0
+        return (tile, bucket), clat, clon, fetch_km
+
+    def get(self, key: TileKey) -> Optional[List[Dict[str, Any]]]:
+        entry = self._cache.get(key)
+        return entry[3] if entry is not None else None
+
+    def set(
+        self, key: TileKey, rows: List[Dict[str, Any]],
+        centre_lat: float, centre_lon: float, fetch_radius_km: float,
+        generation: Optional[int] = None,
+    ) -> None:
+        radius_m = fetch_radius_km * 1000.0
+        if generation is not None:
+            if generation < self._floor:
+                return
+            for invalidated, lat, lon in reversed(self._invalidated):
+                if invalidated <= generation:
+                    break
+                if haversine_m(centre_lat, centre_lon, lat, lon) <= radius_m:
+                    return
+        self._cache.set(key, (centre_lat, centre_lon, radius_m, rows))
+
+    def invalidate_point(self, latitude: float, longitude: float) -> int:
+        """Drop only the tiles whose coverage area contains this point."""
+        self.generation += 1
+        self._invalidated.append((self.generation, latitude, longitude))
+        if len(self._invalidated) > INVALIDATION_LOG_SIZE:
+            self._floor = self._invalidated.popleft()[0]
+        def touched(key: Hashable, entry: TileEntry) -> bool:
+            clat, clon, radius_m, _ = entry
+            return haversine_m(clat, clon, latitude, longitude) <= radius_m
+        return self._cache.invalidate_where(touched)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._floor = self.generation
+        self._invalidated.clear()
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+    @staticmethod
+    def filter_rows(
+        rows: List[Dict[str, Any]], latitude: float, longitude: float, radius_km: float,
+        hazard_types: Optional[AbstractSet[str]] = None,
+        severity_levels: Optional[AbstractSet[str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Narrow a tile entry to the request's radius and filters, nearest first."""
+        radius_m = radius_km * 1000.0
+        hits = []
+        for row in rows:
+            if not matches_filters(row, hazard_types, severity_levels):
+                continue
+            d = haversine_m(
+                latitude, longitude, float(row["latitude"]), float(row["longitude"]),
+            )
+            if d <= radius_m:
+                hits.append((d, row))
+        return nearest_first(hits, limit)
+
+
+# ── Hazard Vector Tile Cache ──────────────────────────────────────────────────
+
+TileXYZ = Tuple[int, int, int]
+
+# Render buffer get_hazard_tile keeps around each tile (64 of 4096 units),
+# as a fraction of the tile side
+TILE_BUFFER_FRACTION = 64 / 4096
+
+# (etag, encoded tile)
+TileBlob = Tuple[str, bytes]
+
+
+class HazardTileCache:
+    """
+    Caches encoded vector tiles per (z, x, y).
+
+    A new hazard drops every cached tile whose buffered extent contains it,
+    at every zoom, and bumps those tiles' generations so only a fetch of one
+    of them that raced the insert is not stored. Each tile carries an ETag
+    derived from its bytes, so a client revalidating an unchanged tile gets
+    a 304.
+    """
+
+    def __init__(self, max_zoom: int, max_entries: int, ttl_seconds: float):
+        self.max_zoom = max_zoom
+        self._cache: VersionedTTLCache[TileBlob] = VersionedTTLCache(max_entries, ttl_seconds)
+
+    @property
+    def generation(self) -> int:
+        return self._cache.generation
+
+    @staticmethod
+    def etag(data: bytes) -> str:
+        return '"' + hashlib.blake2b(data, digest_size=12).hexdigest() + '"'
+
+    def get(self, key: TileXYZ) -> Optional[TileBlob]:
+        return self._cache.get(key)
+
+    def set(self, key: TileXYZ, data: bytes, generation: Optional[int] = None) -> TileBlob:
+        blob = (self.etag(data), data)
+        self._cache.set(key, blob, generation=generation)
+        return blob
+
+    def invalidate_point(self, latitude: float, longitude: float) -> int:
+        """Drop the tiles, at every zoom, whose buffered extent contains this point."""
+        before = self._cache.invalidations
+        for z in range(self.max_zoom + 1):
+            n = 1 << z
+            fx, fy = tile_fraction(latitude, longitude, z)
+            xs = {min(n - 1, max(0, math.floor(fx + d))) for d in (-TILE_BUFFER_FRACTION, TILE_BUFFER_FRACTION)}
+            ys = {min(n - 1, max(0, math.floor(fy + d))) for d in (-TILE_BUFFER_FRACTION, TILE_BUFFER_FRACTION)}
+            for x in xs:
+                for y in ys:
+                    self._cache.pop((z, x, y))
+        return self._cache.invalidations - before
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+# Global singleton
+nearby_hazards_cache = NearbyHazardsCache(
+    precision=settings.nearby_cache_geohash_precision,
+    max_entries=settings.nearby_cache_max_entries,
+    ttl_seconds=settings.nearby_cache_ttl_seconds,
+)
+
+# driver_id → drivers row, or None for "no such driver" (cached briefly)
+driver_settings_cache: VersionedTTLCache[Optional[Dict[str, Any]]] = VersionedTTLCache(
+    max_entries=settings.settings_cache_max_entries,
+    ttl_seconds=settings.settings_cache_ttl_seconds,
+)
+
+hazard_tile_cache = HazardTileCache(
+    max_zoom=settings.tile_max_zoom,
+    max_entries=settings.tile_cache_max_entries,
+    ttl_seconds=settings.tile_cache_ttl_seconds,
+)
@@ -0,0 +1,78 @@
+"""
+SmartCity Dash - Hazard Clustering
+Grid aggregation of hazard rows for zoomed-out views, so a 50 km query in a
+dense city returns a bounded number of clusters instead of thousands of
+individual hazards.
+
+The grid is anchored at lat/lon 0, not at the query centre, so a driver
+moving a little keeps the same clusters. One pass over the rows; each
+cluster keeps a running centroid, count, worst severity and type tally.
+"""
+
+import math
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.geo import METERS_PER_DEG_LAT
+
+
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+
+class _Cluster:
+    __slots__ = ("count", "lat_sum", "lon_sum", "severity", "severity_rank", "types", "hazard_id")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.lat_sum = 0.0
+        self.lon_sum = 0.0
+        self.severity = "low"
+        self.severity_rank = -1
+        self.types: Counter = Counter()
+        self.hazard_id: Optional[str] = None
+
+
+def grid_clusters(
+    rows: Iterable[Dict[str, Any]], latitude: float, cell_m: float,
+) -> List[Dict[str, Any]]:
+    """
+    Group hazard rows into square cells of about cell_m metres (longitude
+    scaled at the query's latitude). Returns one dict per non-empty cell,
+    largest first: centroid latitude/longitude, count, the worst
+    severity_level, the most common hazard_type, and hazard_id when the
+    cluster is a single hazard.
+    """
+    dlat = cell_m / METERS_PER_DEG_LAT
+    dlon = cell_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians(latitude)), 1e-6))
+    cells: Dict[Tuple[int, int], _Cluster] = {}
+    for row in rows:
+        lat = float(row["latitude"])
+        lon = float(row["longitude"])
+        key = (math.floor(lat / dlat), math.floor(lon / dlon))
+        cluster = cells.get(key)
+        if cluster is None:
+            cluster = cells[key] = _Cluster()
+            cluster.hazard_id = str(row.get("id", ""))
+        cluster.count += 1
+        cluster.lat_sum += lat
+        cluster.lon_sum += lon
+        severity = row.get("severity_level", "medium")
+        rank = SEVERITY_RANK.get(severity, -1)
+        if rank > cluster.severity_rank:
+            cluster.severity_rank = rank
+            cluster.severity = severity
+        cluster.types[row.get("hazard_type", "")] += 1
+
+    out = [
+        {
+            "latitude": c.lat_sum / c.count,
+            "longitude": c.lon_sum / c.count,
+            "count": c.count,
+            "severity_level": c.severity,
+            "hazard_type": c.types.most_common(1)[0][0],
+            "hazard_id": c.hazard_id if c.count == 1 else None,
+        }
+        for c in cells.values()
+    ]
+    out.sort(key=lambda c: c["count"], reverse=True)
+    return out
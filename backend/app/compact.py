@@ -0,0 +1,92 @@
+"""
+SmartCity Dash - Compact Hazard List Encoding
+Opt-in columnar representation of hazard-list responses for clients on slow
+links. Instead of one object per hazard, each field becomes one array, and
+hazard_type / severity_level are dictionary-encoded as small ints:
+
+  {"format": "columnar", ...response fields...,
+   "dictionaries": {"hazard_type": ["pothole", ...], "severity_level": [...]},
+   "columns": {"id": [...], "hazard_type": [0, 0, 1, ...], ...}}
+
+Selected with ?format=columnar|msgpack or an Accept header of
+COLUMNAR_MEDIA_TYPE / MSGPACK_MEDIA_TYPE. MessagePack needs the optional
+msgpack package.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import ORJSONResponse, Response
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.smartcity.columnar+json"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+FORMATS = ("json", "columnar", "msgpack")
+
+HAZARD_COLUMNS = (
+    "id", "driver_id", "hazard_type", "severity_level", "confidence_score",
+    "latitude", "longitude", "created_at", "report_count", "photo_url", "expires_at",
+)
+ROUTE_HAZARD_COLUMNS = HAZARD_COLUMNS + ("distance_along_meters", "distance_from_route_meters")
+DICTIONARY_COLUMNS = ("hazard_type", "severity_level")
+
+
+def negotiate_format(request: Request, requested: Optional[str] = None) -> str:
+    """Pick json, columnar or msgpack from the format query param, else Accept."""
+    if requested is None:
+        accept = request.headers.get("accept", "")
+        if MSGPACK_MEDIA_TYPE in accept:
+            requested = "msgpack"
+        elif COLUMNAR_MEDIA_TYPE in accept:
+            requested = "columnar"
+        else:
+            requested = "json"
+    if requested == "msgpack" and msgpack is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="MessagePack responses are not available on this server.",
+        )
+    return requested
+
+
+def to_columnar(
+    payload: Dict[str, Any], list_field: str = "hazards",
+    column_names: Sequence[str] = HAZARD_COLUMNS,
+) -> Dict[str, Any]:
+    """Turn payload[list_field] (hazard dicts) into dictionary-encoded column arrays."""
+    rows: List[Dict[str, Any]] = payload[list_field]
+    columns: Dict[str, List[Any]] = {
+        name: [row.get(name) for row in rows] for name in column_names
+    }
+    dictionaries: Dict[str, List[str]] = {}
+    for name in DICTIONARY_COLUMNS:
+        codes: Dict[str, int] = {}
+        columns[name] = [codes.setdefault(v, len(codes)) for v in columns[name]]
+        dictionaries[name] = list(codes)
+    compact = {k: v for k, v in payload.items() if k != list_field}
+    compact["format"] = "columnar"
+    compact["dictionaries"] = dictionaries
+    compact["columns"] = columns
+    return compact
+
+
+def hazard_list_response(
+    payload: Dict[str, Any], fmt: str, column_names: Sequence[str] = HAZARD_COLUMNS,
+) -> Response:
+    """Encode a hazard-list payload in the negotiated format."""
+    headers = {"Vary": "Accept"}
+    if fmt == "json":
+        return ORJSONResponse(payload, headers=headers)
+    compact = to_columnar(payload, column_names=column_names)
+    if fmt == "msgpack":
+        return Response(
+            msgpack.packb(compact, use_bin_type=True),
+            media_type=MSGPACK_MEDIA_TYPE, headers=headers,
+        )
+    return ORJSONResponse(compact, media_type=COLUMNAR_MEDIA_TYPE, headers=headers)
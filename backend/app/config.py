@@ -5,7 +5,7 @@ Loads all settings from .env file using pydantic-settings.
 
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import List
+from typing import Dict, List
 import json
 
 
@@ -13,6 +13,18 @@ class Settings(BaseSettings):
     # ── Supabase ──────────────────────────────────────────────────────────
     supabase_url: str = Field(..., env="SUPABASE_URL")
     supabase_key: str = Field(..., env="SUPABASE_KEY")
+    # PostgREST's db-max-rows; longer RPC results are read in pages of this size
+    postgrest_max_rows: int = Field(default=1000, env="POSTGREST_MAX_ROWS")
+
+    # ── Storage backend for hot-path queries ─────────────────────────────
+    # "postgrest" (Supabase REST, default) or "asyncpg" (direct Postgres
+    # pool on DATABASE_URL for insert, nearby and history queries)
+    storage_backend: str = Field(default="postgrest", env="STORAGE_BACKEND")
+    database_url: str = Field(default="", env="DATABASE_URL")
+    database_pool_min_size: int = Field(default=2, env="DATABASE_POOL_MIN_SIZE")
+    database_pool_max_size: int = Field(default=10, env="DATABASE_POOL_MAX_SIZE")
+    # 0 disables prepared statements (needed behind transaction-mode poolers)
+    database_statement_cache_size: int = Field(default=100, env="DATABASE_STATEMENT_CACHE_SIZE")
 
     # ── API Server ────────────────────────────────────────────────────────
     api_host: str = Field(default="0.0.0.0", env="API_HOST")
@@ -23,6 +35,83 @@ class Settings(BaseSettings):
     mock_ai_confidence_min: float = Field(default=0.75, env="MOCK_AI_CONFIDENCE_MIN")
     mock_ai_confidence_max: float = Field(default=0.98, env="MOCK_AI_CONFIDENCE_MAX")
 
+    # ── Batched inference engine ──────────────────────────────────────────
+    inference_engine_enabled: bool = Field(default=True, env="INFERENCE_ENGINE_ENABLED")
+    inference_max_batch_size: int = Field(default=16, env="INFERENCE_MAX_BATCH_SIZE")
+    inference_max_wait_ms: float = Field(default=5.0, env="INFERENCE_MAX_WAIT_MS")
+    inference_workers: int = Field(default=1, env="INFERENCE_WORKERS")
+
+    # ── Image uploads (POST /api/report-hazard-image) ─────────────────────
+    photo_bucket: str = Field(default="hazard-photos", env="PHOTO_BUCKET")
+    image_max_bytes: int = Field(default=8 * 1024 * 1024, env="IMAGE_MAX_BYTES")
+    image_max_width: int = Field(default=4096, env="IMAGE_MAX_WIDTH")
+    image_max_height: int = Field(default=4096, env="IMAGE_MAX_HEIGHT")
+
+    # ── In-memory hazard index (serves nearby-hazards without an RPC) ────
+    hazard_index_enabled: bool = Field(default=True, env="HAZARD_INDEX_ENABLED")
+    hazard_index_cell_deg: float = Field(default=0.05, env="HAZARD_INDEX_CELL_DEG")
+    hazard_index_refresh_seconds: int = Field(default=300, env="HAZARD_INDEX_REFRESH_SECONDS")
+
+    # ── Hazard expiry (per-hazard_type lifetimes, in hours) ──────────────
+    # The database's hazard_lifetimes table drives expire_hazards; keep in step
+    hazard_expiry_enabled: bool = Field(default=True, env="HAZARD_EXPIRY_ENABLED")
+    hazard_lifetimes_hours: str = Field(
+        default='{"traffic_congestion": 1, "accident": 6, "road_debris": 24, '
+                '"waterlogging": 48, "broken_streetlight": 720, "pothole": 2160}',
+        env="HAZARD_LIFETIMES_HOURS",
+    )
+    hazard_prune_interval_seconds: int = Field(default=3600, env="HAZARD_PRUNE_INTERVAL_SECONDS")
+    hazard_prune_batch_size: int = Field(default=5000, env="HAZARD_PRUNE_BATCH_SIZE")
+    # Nearby queries ignore hazards created longer ago than this (0 = no
+    # bound); lets a partitioned hazards table skip old partitions
+    hazard_query_window_days: int = Field(default=365, env="HAZARD_QUERY_WINDOW_DAYS")
+
+    # ── Nearby-hazards tile cache ─────────────────────────────────────────
+    nearby_cache_enabled: bool = Field(default=True, env="NEARBY_CACHE_ENABLED")
+    nearby_cache_ttl_seconds: float = Field(default=30.0, env="NEARBY_CACHE_TTL_SECONDS")
+    nearby_cache_max_entries: int = Field(default=5000, env="NEARBY_CACHE_MAX_ENTRIES")
+    # Finest tile precision, used for small radii; larger radius buckets use coarser tiles
+    nearby_cache_geohash_precision: int = Field(default=6, env="NEARBY_CACHE_GEOHASH_PRECISION")
+
+    # ── Hazard vector tiles (GET /api/tiles/{z}/{x}/{y}.mvt) ──────────────
+    tile_max_zoom: int = Field(default=22, env="TILE_MAX_ZOOM")
+    # Below this zoom hazards are aggregated into grid clusters
+    tile_cluster_below_zoom: int = Field(default=13, env="TILE_CLUSTER_BELOW_ZOOM")
+    tile_cluster_cells: int = Field(default=64, env="TILE_CLUSTER_CELLS")
+    tile_cache_enabled: bool = Field(default=True, env="TILE_CACHE_ENABLED")
+    tile_cache_ttl_seconds: float = Field(default=60.0, env="TILE_CACHE_TTL_SECONDS")
+    tile_cache_max_entries: int = Field(default=2000, env="TILE_CACHE_MAX_ENTRIES")
+
+    # ── Nearby-hazards delta sync ("since" tokens) ────────────────────────
+    # Re-send changes this far before the token's time, covering DB clock
+    # skew and rows that become visible late (e.g. via the ingest queue)
+    delta_sync_overlap_seconds: float = Field(default=10.0, env="DELTA_SYNC_OVERLAP_SECONDS")
+
+    # ── Hazard push stream (WebSocket /ws/hazards) ───────────────────────
+    hazard_stream_enabled: bool = Field(default=True, env="HAZARD_STREAM_ENABLED")
+    hazard_stream_cell_deg: float = Field(default=0.1, env="HAZARD_STREAM_CELL_DEG")
+    hazard_stream_max_pending: int = Field(default=256, env="HAZARD_STREAM_MAX_PENDING")
+
+    # ── Coalescing of identical in-flight database reads ─────────────────
+    single_flight_enabled: bool = Field(default=True, env="SINGLE_FLIGHT_ENABLED")
+
+    # ── Driver settings read-through cache ────────────────────────────────
+    settings_cache_enabled: bool = Field(default=True, env="SETTINGS_CACHE_ENABLED")
+    settings_cache_ttl_seconds: float = Field(default=300.0, env="SETTINGS_CACHE_TTL_SECONDS")
+    settings_cache_negative_ttl_seconds: float = Field(default=30.0, env="SETTINGS_CACHE_NEGATIVE_TTL_SECONDS")
+    settings_cache_max_entries: int = Field(default=10000, env="SETTINGS_CACHE_MAX_ENTRIES")
+
+    # ── Write-behind ingest queue for report-hazard ───────────────────────
+    ingest_queue_enabled: bool = Field(default=False, env="INGEST_QUEUE_ENABLED")
+    ingest_queue_max_size: int = Field(default=10000, env="INGEST_QUEUE_MAX_SIZE")
+    ingest_flush_size: int = Field(default=200, env="INGEST_FLUSH_SIZE")
+    ingest_flush_interval_seconds: float = Field(default=0.5, env="INGEST_FLUSH_INTERVAL_SECONDS")
+
+    # ── Spatio-temporal dedup of hazard reports ───────────────────────────
+    dedup_enabled: bool = Field(default=False, env="DEDUP_ENABLED")
+    dedup_radius_m: float = Field(default=25.0, env="DEDUP_RADIUS_M")
+    dedup_window_minutes: int = Field(default=30, env="DEDUP_WINDOW_MINUTES")
+
     # ── CORS ──────────────────────────────────────────────────────────────
     cors_origins: str = Field(default='["*"]', env="CORS_ORIGINS")
 
@@ -33,6 +122,13 @@ class Settings(BaseSettings):
         except Exception:
             return ["*"]
 
+    @property
+    def hazard_lifetimes_seconds(self) -> Dict[str, float]:
+        try:
+            return {k: float(v) * 3600 for k, v in json.loads(self.hazard_lifetimes_hours).items()}
+        except Exception:
+            return {}
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
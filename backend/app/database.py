@@ -3,13 +3,25 @@ SmartCity Dash - Database Layer
 All Supabase interactions are centralised here.
 """
 
+import asyncio
+import functools
 import logging
 import re
-from typing import Any, Dict, List, Optional
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import (
+    AbstractSet, Any, Awaitable, Callable, Dict, FrozenSet, Hashable, List, Optional, Sequence,
+    Tuple, TypeVar,
+)
 
-from supabase import create_client, Client
+from supabase import acreate_client, AsyncClient
 from app.config import settings
+from app.cache import MISSING, driver_settings_cache, hazard_tile_cache, nearby_hazards_cache
+from app.dedup import recent_hazards
+from app.geo import decode_polyline
+from app.expiry import HAZARD_LIFETIMES
+from app.hazard_index import hazard_index
+from app.hazard_stream import hazard_stream
+from app.pg_backend import postgres_backend
 
 logger = logging.getLogger(__name__)
 
@@ -25,18 +37,229 @@ def is_valid_uuid(value: str) -> bool:
 # ── Supabase Client Singleton ─────────────────────────────────────────────────
 
 class SupabaseClient:
-    _client: Optional[Client] = None
+    """
+    Process-wide async Supabase client.
+
+    The underlying PostgREST session is a pooled httpx.AsyncClient, so
+    concurrent requests share keep-alive connections and never block the
+    event loop. Opened by connect() in the app lifespan, released by close().
+    """
+    _client: Optional[AsyncClient] = None
+    _lock: Optional[asyncio.Lock] = None
 
     @classmethod
-    def get_client(cls) -> Client:
+    async def connect(cls) -> AsyncClient:
         if cls._client is None:
-            cls._client = create_client(settings.supabase_url, settings.supabase_key)
-            logger.info("Supabase client initialised")
+            if cls._lock is None:
+                cls._lock = asyncio.Lock()
+            async with cls._lock:
+                if cls._client is None:
+                    cls._client = await acreate_client(
+                        settings.supabase_url, settings.supabase_key,
+                    )
+                    logger.info("Supabase async client initialised")
         return cls._client
 
+    @classmethod
+    async def close(cls) -> None:
+        if cls._client is None:
+            return
+        try:
+            await cls._client.postgrest.aclose()
+            await cls._client.storage.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing Supabase client: {e}")
+        cls._client = None
+        logger.info("Supabase async client closed")
+
+
+async def get_db() -> AsyncClient:
+    return await SupabaseClient.connect()
+
+
+def user_auth_headers(access_token: Optional[str]) -> Dict[str, str]:
+    """
+    Per-request headers that make one call as the end user (their Supabase
+    access token) rather than with SUPABASE_KEY, so auth.uid() and RLS see
+    them. Set on the request, not the shared client, so concurrent calls
+    for other users are unaffected.
+    """
+    return {"Authorization": f"Bearer {access_token}"} if access_token else {}
+
+
+# ── Request Coalescing ────────────────────────────────────────────────────────
+
+T = TypeVar("T")
+
+
+def _single_flight(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """
+    Concurrent calls with identical arguments share one in-flight call and
+    its result. The shared call is shielded, so a caller that goes away
+    (e.g. client disconnect) doesn't cancel it for the others. Results are
+    shared objects and must be treated as read-only.
+    """
+    inflight: Dict[Hashable, asyncio.Future] = {}
+
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        if not settings.single_flight_enabled:
+            return await fn(*args, **kwargs)
+        key = (args, tuple(sorted(kwargs.items())))
+        task = inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            inflight[key] = task
+            task.add_done_callback(lambda t: inflight.pop(key, None) if inflight.get(key) is t else None)
+        return await asyncio.shield(task)
+
+    return wrapper
+
+
+# ── Paged RPC Reads ───────────────────────────────────────────────────────────
+
+# Chunks of a multi-point query sent at once
+_RPC_CHUNK_CONCURRENCY = 4
+
+
+async def _rpc_rows(fn: str, params: Dict[str, Any], order: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Every row of a set-returning RPC. PostgREST silently cuts each response
+    at db-max-rows (POSTGREST_MAX_ROWS), so a full page is followed by the
+    next one, sorted by order (which must identify rows uniquely) so the
+    pages line up.
+    """
+    db = await get_db()
+    page_size = settings.postgrest_max_rows
+    rows: List[Dict[str, Any]] = []
+    while True:
+        query = db.rpc(fn, params)
+        for column in order:
+            query = query.order(column)
+        result = await query.range(len(rows), len(rows) + page_size - 1).execute()
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
+# ── Hazard Index Sync ─────────────────────────────────────────────────────────
+
+_HAZARD_INDEX_COLUMNS = (
+    "id,driver_id,hazard_type,severity_level,confidence_score,"
+    "latitude,longitude,created_at,report_count,last_reported_at"
+)
+_HAZARD_INDEX_PAGE_SIZE = 1000
+
+def _created_after() -> Optional[str]:
+    """Lower bound on created_at for hazard queries, or None if unbounded."""
+    if settings.hazard_query_window_days <= 0:
+        return None
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.hazard_query_window_days)
+    return cutoff.isoformat()
+
+
+# Rows inserted while a refresh is paging through the table; replayed on top
+# of the snapshot so they are not lost when the index is swapped.
+_inserted_during_refresh: Optional[List[Dict[str, Any]]] = None
+
+
+def _on_hazard_inserted(row: Dict[str, Any]) -> None:
+    """Keep the in-memory index and caches in step with a new hazard."""
+    if settings.nearby_cache_enabled:
+        nearby_hazards_cache.invalidate_point(
+            float(row["latitude"]), float(row["longitude"]),
+        )
+    if settings.tile_cache_enabled:
+        hazard_tile_cache.invalidate_point(
+            float(row["latitude"]), float(row["longitude"]),
+        )
+    if settings.hazard_stream_enabled:
+        hazard_stream.publish(row)
+    if not settings.hazard_index_enabled:
+        return
+    hazard_index.add(row)
+    if _inserted_during_refresh is not None:
+        _inserted_during_refresh.append(row)
+
+
+async def refresh_hazard_index() -> bool:
+    """
+    Rebuild the in-memory hazard index from the hazards table.
+    Used for the cold start and for periodic reconciliation.
+    Returns False (leaving the current index untouched) on failure.
+    """
+    global _inserted_during_refresh
+    if not settings.hazard_index_enabled:
+        return False
+    _inserted_during_refresh = []
+    try:
+        db = await get_db()
+        created_after = _created_after()
+        rows: List[Dict[str, Any]] = []
+        last_id: Optional[str] = None
+        while True:
+            query = db.table("hazards").select(_HAZARD_INDEX_COLUMNS).eq("expired", False)
+            if created_after is not None:
+                query = query.gte("created_at", created_after)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            result = await query.order("id").limit(_HAZARD_INDEX_PAGE_SIZE).execute()
+            page = result.data or []
+            rows.extend(page)
+            if len(page) < _HAZARD_INDEX_PAGE_SIZE:
+                break
+            last_id = page[-1]["id"]
+        rows.extend(_inserted_during_refresh)
+        hazard_index.replace_all(rows)
+        logger.info(f"Hazard index refreshed: {len(hazard_index)} hazards")
+        return True
+    except Exception as e:
+        logger.error(f"refresh_hazard_index failed: {e}")
+        return False
+    finally:
+        _inserted_during_refresh = None
 
-def get_db() -> Client:
-    return SupabaseClient.get_client()
+
+async def expire_hazards() -> int:
+    """
+    Flag hazards past their lifetime as expired in the database, in batches,
+    and drop them from the in-memory index. Returns the number flagged.
+
+    The database applies its own hazard_lifetimes table and only lets
+    service_role run this; with an anon key the pg_cron job does the
+    flagging and this just prunes the index.
+    """
+    if not settings.hazard_expiry_enabled or not HAZARD_LIFETIMES:
+        return 0
+    db = await get_db()
+    total = 0
+    try:
+        while True:
+            result = await db.rpc("expire_hazards", {
+                "p_batch_size": settings.hazard_prune_batch_size,
+            }).execute()
+            count = int(result.data or 0)
+            total += count
+            if count < settings.hazard_prune_batch_size:
+                break
+    except Exception as e:
+        if getattr(e, "code", None) == "42501":
+            logger.warning(
+                "expire_hazards needs the service_role key; relying on the database's "
+                "pg_cron expiry job and pruning the in-memory index only"
+            )
+        else:
+            logger.error(f"expire_hazards failed after {total} hazards: {e}")
+    if settings.hazard_index_enabled:
+        hazard_index.prune_expired()
+    if total and settings.nearby_cache_enabled:
+        nearby_hazards_cache.clear()
+    if total and settings.tile_cache_enabled:
+        hazard_tile_cache.clear()
+    if total:
+        logger.info(f"Expired {total} hazards")
+    return total
 
 
 # ── Hazard Functions ──────────────────────────────────────────────────────────
@@ -44,140 +267,700 @@ def get_db() -> Client:
 async def insert_hazard(
     driver_id: str, latitude: float, longitude: float,
     hazard_type: str, severity_level: str, confidence_score: float,
+    photo_url: Optional[str] = None,
 ) -> Dict[str, Any]:
     if not is_valid_uuid(driver_id):
         raise ValueError(f"driver_id '{driver_id}' is not a valid UUID")
-    db = get_db()
+    if postgres_backend.enabled:
+        try:
+            row = await postgres_backend.insert_hazard(
+                driver_id, latitude, longitude, hazard_type, severity_level,
+                confidence_score, photo_url,
+            )
+            if row is None:
+                raise ValueError("No data returned from insert_hazard")
+            _on_hazard_inserted(row)
+            return row
+        except Exception as e:
+            logger.error(f"insert_hazard failed: {e}")
+            raise
+    db = await get_db()
+    params = {
+        "p_driver_id": driver_id,
+        "p_latitude": latitude,
+        "p_longitude": longitude,
+        "p_hazard_type": hazard_type,
+        "p_severity_level": severity_level,
+        "p_confidence_score": confidence_score,
+    }
+    if photo_url is not None:
+        params["p_photo_url"] = photo_url
     try:
-        result = db.rpc("insert_hazard", {
+        result = await db.rpc("insert_hazard", params).execute()
+        if result.data and len(result.data) > 0:
+            row = result.data[0]
+            _on_hazard_inserted(row)
+            return row
+        raise ValueError("No data returned from insert_hazard RPC")
+    except Exception as e:
+        logger.error(f"insert_hazard failed: {e}")
+        raise
+
+
+# Cleared once merge_hazard_report is refused (it needs the service_role key)
+_direct_merge_allowed = True
+
+
+async def merge_hazard_report(
+    hazard_id: str, severity_level: str, confidence_score: float,
+) -> Optional[Dict[str, Any]]:
+    """
+    Fold a repeat sighting into an existing hazard; None if it no longer
+    exists, or if the key may not call the RPC (the caller then takes the
+    insert_hazard_dedup path, which merges as the function owner).
+    """
+    global _direct_merge_allowed
+    if not _direct_merge_allowed:
+        return None
+    db = await get_db()
+    try:
+        result = await db.rpc("merge_hazard_report", {
+            "p_hazard_id": hazard_id,
+            "p_severity_level": severity_level,
+            "p_confidence_score": confidence_score,
+        }).execute()
+    except Exception as e:
+        if getattr(e, "code", None) == "42501":
+            _direct_merge_allowed = False
+            logger.warning(
+                "merge_hazard_report needs the service_role key; merging repeat "
+                "reports through insert_hazard_dedup instead"
+            )
+            return None
+        raise
+    if result.data and len(result.data) > 0:
+        return result.data[0]
+    return None
+
+
+async def insert_hazard_dedup(
+    driver_id: str, latitude: float, longitude: float,
+    hazard_type: str, severity_level: str, confidence_score: float,
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Insert a hazard unless it duplicates a recent one of the same type nearby,
+    in which case the report is merged into that hazard.
+    Returns (canonical hazard row, merged).
+    """
+    if not is_valid_uuid(driver_id):
+        raise ValueError(f"driver_id '{driver_id}' is not a valid UUID")
+    try:
+        # Hot path: a duplicate of a hazard this process saw recently
+        # is merged by primary key, without a spatial search in SQL
+        existing = recent_hazards.match(latitude, longitude, hazard_type)
+        if existing is not None and _direct_merge_allowed:
+            row = await merge_hazard_report(existing, severity_level, confidence_score)
+            if row is not None:
+                _on_hazard_inserted(row)
+                recent_hazards.remember(row)
+                return row, True
+            recent_hazards.forget(existing)
+
+        db = await get_db()
+        result = await db.rpc("insert_hazard_dedup", {
             "p_driver_id": driver_id,
             "p_latitude": latitude,
             "p_longitude": longitude,
             "p_hazard_type": hazard_type,
             "p_severity_level": severity_level,
             "p_confidence_score": confidence_score,
+            "p_radius_m": settings.dedup_radius_m,
+            "p_window_minutes": settings.dedup_window_minutes,
         }).execute()
-        if result.data and len(result.data) > 0:
-            return result.data[0]
-        raise ValueError("No data returned from insert_hazard RPC")
+        if not result.data:
+            raise ValueError("No data returned from insert_hazard_dedup RPC")
+        row = result.data[0]
+        merged = bool(row.pop("merged", False))
+        _on_hazard_inserted(row)
+        recent_hazards.remember(row)
+        return row, merged
     except Exception as e:
-        logger.error(f"insert_hazard failed: {e}")
+        logger.error(f"insert_hazard_dedup failed: {e}")
         raise
 
 
+async def insert_hazards(hazards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Insert many hazards with one multi-row RPC call.
+    Each item carries the insert_hazard fields (driver_id, latitude, longitude,
+    hazard_type, severity_level, confidence_score). The insert is a single
+    statement, so it is all-or-nothing. Returns rows in input order.
+    """
+    for item in hazards:
+        if not is_valid_uuid(item["driver_id"]):
+            raise ValueError(f"driver_id '{item['driver_id']}' is not a valid UUID")
+    if not hazards:
+        return []
+    db = await get_db()
+    try:
+        result = await db.rpc("insert_hazards", {"p_hazards": hazards}).execute()
+        rows = sorted(result.data or [], key=lambda r: r["item_index"])
+        if len(rows) != len(hazards):
+            raise ValueError(
+                f"insert_hazards RPC returned {len(rows)} rows for {len(hazards)} items"
+            )
+        for row in rows:
+            row.pop("item_index", None)
+            _on_hazard_inserted(row)
+        return rows
+    except Exception as e:
+        logger.error(f"insert_hazards failed: {e}")
+        raise
+
+
+async def insert_hazards_dedup(hazards: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], bool]]:
+    """
+    insert_hazard_dedup for a batch, in one RPC call and one transaction.
+    Items are shaped as for insert_hazards. Returns (canonical hazard row,
+    merged) per item, in input order.
+    """
+    for item in hazards:
+        if not is_valid_uuid(item["driver_id"]):
+            raise ValueError(f"driver_id '{item['driver_id']}' is not a valid UUID")
+    if not hazards:
+        return []
+    db = await get_db()
+    try:
+        result = await db.rpc("insert_hazards_dedup", {
+            "p_hazards": hazards,
+            "p_radius_m": settings.dedup_radius_m,
+            "p_window_minutes": settings.dedup_window_minutes,
+        }).execute()
+        rows = sorted(result.data or [], key=lambda r: r["item_index"])
+        if len(rows) != len(hazards):
+            raise ValueError(
+                f"insert_hazards_dedup RPC returned {len(rows)} rows for {len(hazards)} items"
+            )
+        out = []
+        for row in rows:
+            row.pop("item_index", None)
+            merged = bool(row.pop("merged", False))
+            _on_hazard_inserted(row)
+            recent_hazards.remember(row)
+            out.append((row, merged))
+        return out
+    except Exception as e:
+        logger.error(f"insert_hazards_dedup failed: {e}")
+        raise
+
+
+@_single_flight
+async def _fetch_hazards_within_radius(
+    latitude: float, longitude: float, radius_km: float,
+    hazard_types: Optional[FrozenSet[str]] = None,
+    severity_levels: Optional[FrozenSet[str]] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    if settings.hazard_index_enabled and hazard_index.ready:
+        return hazard_index.query(
+            latitude, longitude, radius_km, hazard_types, severity_levels, limit,
+        )
+    lifetimes = HAZARD_LIFETIMES if settings.hazard_expiry_enabled else None
+    created_after = _created_after()
+    if postgres_backend.enabled:
+        return await postgres_backend.hazards_within_radius(
+            latitude, longitude, radius_km, lifetimes, created_after,
+            sorted(hazard_types) if hazard_types is not None else None,
+            sorted(severity_levels) if severity_levels is not None else None,
+            limit,
+        )
+    params: Dict[str, Any] = {
+        "p_latitude": latitude,
+        "p_longitude": longitude,
+        "p_radius_km": radius_km,
+    }
+    if lifetimes is not None:
+        params["p_lifetimes"] = lifetimes
+    if created_after is not None:
+        params["p_created_after"] = created_after
+    if hazard_types is not None:
+        params["p_hazard_types"] = sorted(hazard_types)
+    if severity_levels is not None:
+        params["p_severity_levels"] = sorted(severity_levels)
+    if limit is not None:
+        params["p_max_results"] = limit
+    return await _rpc_rows("get_hazards_within_radius", params, ("distance_meters", "id"))
+
+
+async def query_hazards_within_radius(
+    latitude: float, longitude: float, radius_km: float,
+    hazard_types: Optional[AbstractSet[str]] = None,
+    severity_levels: Optional[AbstractSet[str]] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Like get_hazards_within_radius, but raises instead of returning [] on error.
+
+    Cached tiles hold every hazard in the tile; filters and limit are
+    applied per request on top of them.
+    """
+    hazard_types = frozenset(hazard_types) if hazard_types is not None else None
+    severity_levels = frozenset(severity_levels) if severity_levels is not None else None
+    tile = None
+    if settings.nearby_cache_enabled:
+        tile = nearby_hazards_cache.tile_query(latitude, longitude, radius_km)
+    if tile is None:
+        return await _fetch_hazards_within_radius(
+            latitude, longitude, radius_km, hazard_types, severity_levels, limit,
+        )
+
+    key, centre_lat, centre_lon, fetch_km = tile
+    rows = nearby_hazards_cache.get(key)
+    if rows is None:
+        generation = nearby_hazards_cache.generation
+        rows = await _fetch_hazards_within_radius(centre_lat, centre_lon, fetch_km)
+        nearby_hazards_cache.set(
+            key, rows, centre_lat, centre_lon, fetch_km, generation=generation,
+        )
+    return nearby_hazards_cache.filter_rows(
+        rows, latitude, longitude, radius_km, hazard_types, severity_levels, limit,
+    )
+
+
 async def get_hazards_within_radius(
     latitude: float, longitude: float, radius_km: float,
+    hazard_types: Optional[AbstractSet[str]] = None,
+    severity_levels: Optional[AbstractSet[str]] = None,
+    limit: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
-    db = get_db()
     try:
-        result = db.rpc("get_hazards_within_radius", {
-            "p_latitude": latitude,
-            "p_longitude": longitude,
-            "p_radius_km": radius_km,
-        }).execute()
-        return result.data or []
+        return await query_hazards_within_radius(
+            latitude, longitude, radius_km, hazard_types, severity_levels, limit,
+        )
     except Exception as e:
         logger.error(f"get_hazards_within_radius failed: {e}")
         return []
 
 
-async def get_driver_history(
-    driver_id: str, limit: int = 100, offset: int = 0,
+def _points_params(
+    points: Sequence[Tuple[float, float, float]],
+    lifetimes: Optional[Dict[str, float]], created_after: Optional[str],
+    hazard_types: Optional[AbstractSet[str]], severity_levels: Optional[AbstractSet[str]],
+) -> Dict[str, Any]:
+    params: Dict[str, Any] = {
+        "p_latitudes": [p[0] for p in points],
+        "p_longitudes": [p[1] for p in points],
+        "p_radii_km": [p[2] for p in points],
+    }
+    if lifetimes is not None:
+        params["p_lifetimes"] = lifetimes
+    if created_after is not None:
+        params["p_created_after"] = created_after
+    if hazard_types is not None:
+        params["p_hazard_types"] = sorted(hazard_types)
+    if severity_levels is not None:
+        params["p_severity_levels"] = sorted(severity_levels)
+    return params
+
+
+async def get_hazards_near_points(
+    points: Sequence[Tuple[float, float, float]],
+    hazard_types: Optional[AbstractSet[str]] = None,
+    severity_levels: Optional[AbstractSet[str]] = None,
+    limit: Optional[int] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Hazards around each (latitude, longitude, radius_km) point, nearest
+    first, in one index pass or one set-based query. One list per point,
+    in order; all empty on error.
+    """
+    try:
+        if settings.hazard_index_enabled and hazard_index.ready:
+            return [
+                hazard_index.query(lat, lon, r, hazard_types, severity_levels, limit)
+                for lat, lon, r in points
+            ]
+        lifetimes = HAZARD_LIFETIMES if settings.hazard_expiry_enabled else None
+        created_after = _created_after()
+        if postgres_backend.enabled:
+            rows = await postgres_backend.hazards_near_points(
+                points, lifetimes, created_after,
+                sorted(hazard_types) if hazard_types is not None else None,
+                sorted(severity_levels) if severity_levels is not None else None,
+                limit,
+            )
+        else:
+            # Chunks sized so each usually fits in one PostgREST page
+            chunk_size = max(1, settings.postgrest_max_rows // limit) if limit else 1
+            semaphore = asyncio.Semaphore(_RPC_CHUNK_CONCURRENCY)
+
+            async def fetch_chunk(start: int) -> List[Dict[str, Any]]:
+                params = _points_params(
+                    points[start:start + chunk_size], lifetimes, created_after,
+                    hazard_types, severity_levels,
+                )
+                if limit is not None:
+                    params["p_max_results"] = limit
+                async with semaphore:
+                    chunk_rows = await _rpc_rows(
+                        "get_hazards_near_points", params, ("point_index", "distance_meters", "id"),
+                    )
+                for row in chunk_rows:
+                    row["point_index"] += start
+                return chunk_rows
+
+            chunks = await asyncio.gather(
+                *(fetch_chunk(start) for start in range(0, len(points), chunk_size))
+            )
+            rows = [row for chunk_rows in chunks for row in chunk_rows]
+        per_point: List[List[Dict[str, Any]]] = [[] for _ in points]
+        for row in rows:
+            per_point[row["point_index"]].append(row)
+        return per_point
+    except Exception as e:
+        logger.error(f"get_hazards_near_points failed for {len(points)} points: {e}")
+        return [[] for _ in points]
+
+
+async def count_hazards_near_points(
+    points: Sequence[Tuple[float, float, float]],
+    hazard_types: Optional[AbstractSet[str]] = None,
+    severity_levels: Optional[AbstractSet[str]] = None,
+) -> List[int]:
+    """Like get_hazards_near_points, but only each point's hazard count."""
+    try:
+        if settings.hazard_index_enabled and hazard_index.ready:
+            return [
+                hazard_index.count(lat, lon, r, hazard_types, severity_levels)
+                for lat, lon, r in points
+            ]
+        lifetimes = HAZARD_LIFETIMES if settings.hazard_expiry_enabled else None
+        created_after = _created_after()
+        if postgres_backend.enabled:
+            rows = await postgres_backend.hazards_near_points(
+                points, lifetimes, created_after,
+                sorted(hazard_types) if hazard_types is not None else None,
+                sorted(severity_levels) if severity_levels is not None else None,
+                counts_only=True,
+            )
+        else:
+            db = await get_db()
+            params = _points_params(points, lifetimes, created_after, hazard_types, severity_levels)
+            result = await db.rpc("count_hazards_near_points", params).execute()
+            rows = result.data or []
+        counts = [0] * len(points)
+        for row in rows:
+            counts[row["point_index"]] = int(row["hazard_count"])
+        return counts
+    except Exception as e:
+        logger.error(f"count_hazards_near_points failed for {len(points)} points: {e}")
+        return [0] * len(points)
+
+
+@_single_flight
+async def _fetch_hazards_along_route(
+    polyline: str, corridor_m: float,
+    hazard_types: Optional[FrozenSet[str]] = None,
+    severity_levels: Optional[FrozenSet[str]] = None,
+    limit: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
+    if settings.hazard_index_enabled and hazard_index.ready:
+        return hazard_index.query_route(
+            decode_polyline(polyline), corridor_m, hazard_types, severity_levels, limit,
+        )
+    lifetimes = HAZARD_LIFETIMES if settings.hazard_expiry_enabled else None
+    created_after = _created_after()
+    if postgres_backend.enabled:
+        return await postgres_backend.hazards_along_route(
+            polyline, corridor_m, lifetimes, created_after,
+            sorted(hazard_types) if hazard_types is not None else None,
+            sorted(severity_levels) if severity_levels is not None else None,
+            limit,
+        )
+    params: Dict[str, Any] = {
+        "p_polyline": polyline,
+        "p_corridor_m": corridor_m,
+    }
+    if lifetimes is not None:
+        params["p_lifetimes"] = lifetimes
+    if created_after is not None:
+        params["p_created_after"] = created_after
+    if hazard_types is not None:
+        params["p_hazard_types"] = sorted(hazard_types)
+    if severity_levels is not None:
+        params["p_severity_levels"] = sorted(severity_levels)
+    if limit is not None:
+        params["p_max_results"] = limit
+    return await _rpc_rows("get_hazards_along_route", params, ("distance_along_meters", "id"))
+
+
+async def get_hazards_along_route(
+    polyline: str, corridor_m: float,
+    hazard_types: Optional[AbstractSet[str]] = None,
+    severity_levels: Optional[AbstractSet[str]] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Hazards within corridor_m of an encoded-polyline route, in order along it."""
+    try:
+        return await _fetch_hazards_along_route(
+            polyline, corridor_m,
+            frozenset(hazard_types) if hazard_types is not None else None,
+            frozenset(severity_levels) if severity_levels is not None else None,
+            limit,
+        )
+    except Exception as e:
+        logger.error(f"get_hazards_along_route failed: {e}")
+        return []
+
+
+# ── Hazard Vector Tiles ───────────────────────────────────────────────────────
+
+def _decode_bytea(value: Any) -> bytes:
+    """PostgREST returns bytea as a "\\x..." hex string."""
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if not value:
+        return b""
+    return bytes.fromhex(value[2:] if value.startswith("\\x") else value)
+
+
+@_single_flight
+async def _fetch_hazard_tile(z: int, x: int, y: int) -> bytes:
+    lifetimes = HAZARD_LIFETIMES if settings.hazard_expiry_enabled else None
+    created_after = _created_after()
+    if postgres_backend.enabled:
+        return await postgres_backend.hazard_tile(
+            z, x, y, settings.tile_cluster_below_zoom, settings.tile_cluster_cells,
+            lifetimes, created_after,
+        )
+    db = await get_db()
+    params: Dict[str, Any] = {
+        "p_z": z,
+        "p_x": x,
+        "p_y": y,
+        "p_cluster_below_zoom": settings.tile_cluster_below_zoom,
+        "p_cluster_cells": settings.tile_cluster_cells,
+    }
+    if lifetimes is not None:
+        params["p_lifetimes"] = lifetimes
+    if created_after is not None:
+        params["p_created_after"] = created_after
+    result = await db.rpc("get_hazard_tile", params).execute()
+    return _decode_bytea(result.data)
+
+
+async def get_hazard_tile(z: int, x: int, y: int) -> Tuple[str, bytes]:
+    """Return (etag, Mapbox Vector Tile bytes) for tile z/x/y; raises on error."""
+    if not settings.tile_cache_enabled:
+        data = await _fetch_hazard_tile(z, x, y)
+        return hazard_tile_cache.etag(data), data
+    key = (z, x, y)
+    blob = hazard_tile_cache.get(key)
+    if blob is None:
+        generation = hazard_tile_cache.generation
+        data = await _fetch_hazard_tile(z, x, y)
+        blob = hazard_tile_cache.set(key, data, generation=generation)
+    return blob
+
+
+@_single_flight
+async def get_driver_history(
+    driver_id: str, limit: int = 100, offset: int = 0, estimate_count: bool = False,
+    after: Optional[Tuple[str, str]] = None, include_count: bool = True,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Return (page of rows, total count) for a driver in one PostgREST request
+    (or one pooled connection with STORAGE_BACKEND=asyncpg).
+
+    Rows are ordered newest first by (created_at, id). Pass after=(created_at, id)
+    of the last row seen for keyset pagination; offset is then ignored and the
+    page costs the same however deep it is. With estimate_count, PostgREST
+    returns an exact count for small result sets and the planner's estimate
+    for large ones. With include_count=False no count is taken and None is
+    returned in its place.
+    """
     if not is_valid_uuid(driver_id):
         logger.warning(f"get_driver_history: invalid UUID '{driver_id}', returning empty")
-        return []
-    db = get_db()
+        return [], 0
+    if postgres_backend.enabled:
+        try:
+            return await postgres_backend.driver_history(
+                driver_id, limit, offset, after, include_count, estimate_count,
+            )
+        except Exception as e:
+            logger.error(f"get_driver_history failed for {driver_id}: {e}")
+            return [], 0
+    db = await get_db()
     try:
-        result = (
-            db.table("hazards")
-            .select("*")
-            .eq("driver_id", driver_id)
+        if include_count:
+            query = db.table("hazards").select(
+                "*", count="estimated" if estimate_count else "exact",
+            )
+        else:
+            query = db.table("hazards").select("*")
+        query = query.eq("driver_id", driver_id)
+        if after is not None:
+            created_at, hazard_id = after
+            # The plain range bound lets the planner seek
+            # idx_hazards_driver_created_id; the OR alone can't be used as one
+            query = query.lte("created_at", created_at).or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt.{hazard_id})'
+            )
+            query = query.limit(limit)
+        else:
+            query = query.range(offset, offset + limit - 1)
+        result = await (
+            query
             .order("created_at", desc=True)
-            .range(offset, offset + limit - 1)
+            .order("id", desc=True)
             .execute()
         )
-        return result.data or []
+        total = (result.count or 0) if include_count else None
+        return result.data or [], total
     except Exception as e:
         logger.error(f"get_driver_history failed for {driver_id}: {e}")
-        return []
+        return [], 0
 
 
-async def count_driver_history(driver_id: str) -> int:
-    if not is_valid_uuid(driver_id):
-        return 0
-    db = get_db()
+# ── Photo Storage ─────────────────────────────────────────────────────────────
+
+_UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+async def upload_hazard_photo(
+    path: str, data: memoryview, content_type: str, access_token: Optional[str] = None,
+) -> str:
+    """
+    Upload an image to the photo bucket and return its public URL.
+    The body is streamed in slices of the caller's buffer, never copied whole.
+    With access_token the upload is made as that driver, whom the bucket's
+    policies confine to their own folder; without it SUPABASE_KEY must be
+    the service_role key.
+    """
+    db = await get_db()
+    storage = db.storage
+
+    async def body():
+        for start in range(0, len(data), _UPLOAD_CHUNK_BYTES):
+            yield data[start:start + _UPLOAD_CHUNK_BYTES]
+
     try:
-        result = (
-            db.table("hazards")
-            .select("id", count="exact")
-            .eq("driver_id", driver_id)
-            .execute()
+        response = await storage.session.post(
+            f"/object/{settings.photo_bucket}/{path}",
+            content=body(),
+            headers={
+                "content-type": content_type,
+                "content-length": str(len(data)),
+                "x-upsert": "false",
+                **user_auth_headers(access_token),
+            },
         )
-        return result.count or 0
+        response.raise_for_status()
+        url = await storage.from_(settings.photo_bucket).get_public_url(path)
+        return url.rstrip("?")
     except Exception as e:
-        logger.error(f"count_driver_history failed: {e}")
-        return 0
+        logger.error(f"upload_hazard_photo failed for {path}: {e}")
+        raise
+
+
+async def delete_hazard_photo(path: str, access_token: Optional[str] = None) -> None:
+    """Remove an uploaded photo whose hazard was never stored; failures are only logged."""
+    try:
+        db = await get_db()
+        response = await db.storage.session.request(
+            "DELETE", f"/object/{settings.photo_bucket}",
+            json={"prefixes": [path]}, headers=user_auth_headers(access_token),
+        )
+        response.raise_for_status()
+    except Exception as e:
+        logger.error(f"delete_hazard_photo failed for {path}: {e}")
 
 
 # ── Driver Settings Functions ─────────────────────────────────────────────────
 
+@_single_flight
+async def _fetch_driver_settings(driver_id: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """(settings cache generation when the read started, drivers row or None)."""
+    generation = driver_settings_cache.generation
+    db = await get_db()
+    result = await (
+        db.table("drivers")
+        .select("*")
+        .eq("id", driver_id)
+        .maybe_single()
+        .execute()
+    )
+    # maybe_single() yields no response at all when the row doesn't exist
+    return generation, result.data if result is not None else None
+
+
 async def get_driver_settings(driver_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the driver's row, or None if it doesn't exist or can't be read.
+    Read-through cached; "not found" is cached for a shorter TTL.
+    """
     if not is_valid_uuid(driver_id):
         logger.warning(f"get_driver_settings: invalid UUID '{driver_id}'")
         return None
-    db = get_db()
+    if settings.settings_cache_enabled:
+        cached = driver_settings_cache.get(driver_id, MISSING)
+        if cached is not MISSING:
+            return cached
     try:
-        result = (
-            db.table("drivers")
-            .select("*")
-            .eq("id", driver_id)
-            .maybe_single()
-            .execute()
-        )
-        return result.data
+        generation, row = await _fetch_driver_settings(driver_id)
     except Exception as e:
         logger.error(f"get_driver_settings failed for {driver_id}: {e}")
         return None
+    if settings.settings_cache_enabled:
+        # A settings write that landed while this read was in flight wins
+        if row is None:
+            driver_settings_cache.set(
+                driver_id, None, ttl_seconds=settings.settings_cache_negative_ttl_seconds,
+                generation=generation,
+            )
+        else:
+            driver_settings_cache.set(driver_id, row, generation=generation)
+    return row
 
 
-async def upsert_driver_settings(
-    driver_id: str, settings_data: Dict[str, Any],
-) -> Optional[Dict[str, Any]]:
-    if not is_valid_uuid(driver_id):
-        return None
-    db = get_db()
-    now = datetime.now(timezone.utc).isoformat()
-    payload = {"id": driver_id, **settings_data, "updated_at": now}
-    try:
-        result = db.table("drivers").upsert(payload, on_conflict="id").execute()
-        if result.data and len(result.data) > 0:
-            return result.data[0]
-        return None
-    except Exception as e:
-        logger.error(f"upsert_driver_settings failed: {e}")
-        return None
+def _cache_driver_settings(driver_id: str, row: Optional[Dict[str, Any]]) -> None:
+    """Write-through after a settings write; drop the entry if the write failed."""
+    if not settings.settings_cache_enabled:
+        return
+    if row is None:
+        driver_settings_cache.pop(driver_id)
+    else:
+        driver_settings_cache.set(driver_id, row)
 
 
 async def update_driver_settings(
-    driver_id: str, settings_data: Dict[str, Any],
+    driver_id: str, settings_data: Dict[str, Any], access_token: Optional[str] = None,
 ) -> Optional[Dict[str, Any]]:
+    """
+    Patch the provided settings columns in one atomic upsert, creating the
+    drivers row on first write. Returns the stored row, or None if there is
+    no such user. Raises ValueError for an invalid driver_id and re-raises
+    database errors.
+
+    The upsert only lets a driver change their own row, so it runs as the
+    user whose access_token is given (or as SUPABASE_KEY if that is the
+    service_role key).
+    """
     if not is_valid_uuid(driver_id):
-        return None
-    db = get_db()
-    now = datetime.now(timezone.utc).isoformat()
-    payload = {**settings_data, "updated_at": now}
-    try:
-        result = (
-            db.table("drivers")
-            .update(payload)
-            .eq("id", driver_id)
-            .execute()
-        )
-        if result.data and len(result.data) > 0:
-            return result.data[0]
-        logger.info(f"Driver {driver_id} not found, attempting upsert")
-        return await upsert_driver_settings(driver_id, settings_data)
+        raise ValueError(f"driver_id '{driver_id}' is not a valid UUID")
+    db = await get_db()
+    try:
+        query = db.rpc("upsert_driver_settings", {
+            "p_driver_id": driver_id,
+            "p_settings": settings_data,
+        })
+        query.headers.update(user_auth_headers(access_token))
+        result = await query.execute()
     except Exception as e:
         logger.error(f"update_driver_settings failed for {driver_id}: {e}")
-        return None
+        _cache_driver_settings(driver_id, None)
+        raise
+    row = result.data[0] if result.data else None
+    _cache_driver_settings(driver_id, row)
+    return row
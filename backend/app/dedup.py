@@ -0,0 +1,105 @@
+"""
+SmartCity Dash - Hazard Report Deduplication
+Spatial hash of canonical hazards reported within the dedup window, so that a
+repeat sighting (same hazard_type within dedup_radius_m metres and
+dedup_window_minutes) can be merged into the existing hazard by primary key
+instead of inserting a new row.
+
+This only covers reports seen by this process; insert_hazard_dedup in
+supabase_setup.sql performs the same check in SQL for everything else.
+"""
+
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+from app.geo import METERS_PER_DEG_LAT, haversine_m
+
+
+CellKey = Tuple[str, int, int]
+
+
+class RecentHazardHash:
+    """
+    Canonical hazards bucketed by (hazard_type, lat cell, lon cell), where
+    cells are radius_m tall. Entries expire window_seconds after their last
+    sighting.
+    """
+
+    def __init__(self, radius_m: float, window_seconds: float):
+        self.radius_m = radius_m
+        self.window_seconds = window_seconds
+        self.cell_deg = radius_m / METERS_PER_DEG_LAT
+        self._cells: Dict[CellKey, Dict[str, Tuple[float, float]]] = {}
+        # hazard_id → (last_seen, cell key), oldest sighting first
+        self._seen: "OrderedDict[str, Tuple[float, CellKey]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def _cell(self, hazard_type: str, latitude: float, longitude: float) -> CellKey:
+        return (
+            hazard_type,
+            int(math.floor(latitude / self.cell_deg)),
+            int(math.floor(longitude / self.cell_deg)),
+        )
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        while self._seen:
+            hazard_id, (last_seen, key) = next(iter(self._seen.items()))
+            if last_seen > cutoff:
+                break
+            self._seen.popitem(last=False)
+            bucket = self._cells.get(key)
+            if bucket is not None:
+                bucket.pop(hazard_id, None)
+                if not bucket:
+                    del self._cells[key]
+
+    def match(self, latitude: float, longitude: float, hazard_type: str) -> Optional[str]:
+        """Return the id of the nearest live hazard this report duplicates, if any."""
+        self._expire(time.monotonic())
+        _, cy, cx = self._cell(hazard_type, latitude, longitude)
+        cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+        span_x = min(int(math.ceil(1 / cos_lat)), 360)
+        best: Optional[Tuple[float, str]] = None
+        for y in range(cy - 1, cy + 2):
+            for x in range(cx - span_x, cx + span_x + 1):
+                bucket = self._cells.get((hazard_type, y, x))
+                if not bucket:
+                    continue
+                for hazard_id, (lat, lon) in bucket.items():
+                    d = haversine_m(latitude, longitude, lat, lon)
+                    if d <= self.radius_m and (best is None or d < best[0]):
+                        best = (d, hazard_id)
+        return best[1] if best else None
+
+    def remember(self, row: Dict[str, Any]) -> None:
+        """Record a sighting of a canonical hazard row (new or merged)."""
+        now = time.monotonic()
+        hazard_id = str(row["id"])
+        self.forget(hazard_id)
+        key = self._cell(str(row["hazard_type"]), float(row["latitude"]), float(row["longitude"]))
+        self._cells.setdefault(key, {})[hazard_id] = (float(row["latitude"]), float(row["longitude"]))
+        self._seen[hazard_id] = (now, key)
+        self._expire(now)
+
+    def forget(self, hazard_id: str) -> None:
+        entry = self._seen.pop(hazard_id, None)
+        if entry is None:
+            return
+        bucket = self._cells.get(entry[1])
+        if bucket is not None:
+            bucket.pop(hazard_id, None)
+            if not bucket:
+                del self._cells[entry[1]]
+
+
+# Global singleton
+recent_hazards = RecentHazardHash(
+    radius_m=settings.dedup_radius_m,
+    window_seconds=settings.dedup_window_minutes * 60,
+)
@@ -0,0 +1,33 @@
+"""
+SmartCity Dash - Hazard Expiry
+Per-hazard_type lifetimes. A hazard is live until its lifetime has elapsed
+since it was last reported (or created, for rows without last_reported_at);
+re-reports therefore extend it. Types without a lifetime never expire.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+
+# hazard_type → lifetime in seconds
+HAZARD_LIFETIMES: Dict[str, float] = settings.hazard_lifetimes_seconds
+
+
+def hazard_expires_at(row: Dict[str, Any]) -> Optional[datetime]:
+    """Return when the hazard expires, or None if it never does (or is unknown)."""
+    if not settings.hazard_expiry_enabled:
+        return None
+    lifetime = HAZARD_LIFETIMES.get(str(row.get("hazard_type", "")))
+    if lifetime is None:
+        return None
+    stamp = row.get("last_reported_at") or row.get("created_at")
+    if isinstance(stamp, str):
+        try:
+            stamp = datetime.fromisoformat(stamp)
+        except ValueError:
+            return None
+    if not isinstance(stamp, datetime) or stamp.tzinfo is None:
+        return None
+    return stamp + timedelta(seconds=lifetime)
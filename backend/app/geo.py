@@ -0,0 +1,144 @@
+"""
+SmartCity Dash - Geo Helpers
+Distance, geohash, web-mercator tile and polyline utilities shared by the
+in-memory hazard index and caches.
+"""
+
+import math
+from typing import List, Tuple
+
+
+EARTH_RADIUS_M = 6_371_008.8
+METERS_PER_DEG_LAT = 111_320.0
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+_GEOHASH_DECODE = {c: i for i, c in enumerate(_GEOHASH_ALPHABET)}
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in metres between two WGS84 points."""
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 6) -> str:
+    """Encode a point as a geohash string of the given length."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def geohash_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """Return (lat_min, lat_max, lon_min, lon_max) of a geohash cell."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+    for c in geohash:
+        value = _GEOHASH_DECODE[c]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                if bit:
+                    lon_lo = mid
+                else:
+                    lon_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+    return lat_lo, lat_hi, lon_lo, lon_hi
+
+
+def geohash_center(geohash: str) -> Tuple[float, float]:
+    """Return the (latitude, longitude) centre of a geohash cell."""
+    lat_lo, lat_hi, lon_lo, lon_hi = geohash_bbox(geohash)
+    return (lat_lo + lat_hi) / 2, (lon_lo + lon_hi) / 2
+
+
+def geohash_half_diagonal_m(geohash: str) -> float:
+    """Distance from a geohash cell's centre to its farthest corner."""
+    lat_lo, lat_hi, lon_lo, lon_hi = geohash_bbox(geohash)
+    clat, clon = (lat_lo + lat_hi) / 2, (lon_lo + lon_hi) / 2
+    return max(
+        haversine_m(clat, clon, lat_lo, lon_hi),
+        haversine_m(clat, clon, lat_hi, lon_hi),
+    )
+
+
+# Web-mercator latitude limit; tiles cover [-MAX_MERCATOR_LAT, MAX_MERCATOR_LAT]
+MAX_MERCATOR_LAT = 85.0511287798066
+
+
+def tile_fraction(latitude: float, longitude: float, zoom: int) -> Tuple[float, float]:
+    """Fractional (x, y) tile coordinates of a point at a zoom level (XYZ scheme)."""
+    n = 1 << zoom
+    lat = math.radians(max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, latitude)))
+    x = (longitude + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n
+    return x, y
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[Tuple[float, float]]:
+    """
+    Decode an encoded polyline (Google's algorithm) into (latitude, longitude)
+    points. Raises ValueError on malformed input.
+    """
+    factor = 10 ** precision
+    points: List[Tuple[float, float]] = []
+    index = lat = lon = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= length:
+                    raise ValueError("Truncated polyline")
+                b = ord(encoded[index]) - 63
+                index += 1
+                if not 0 <= b < 64:
+                    raise ValueError("Invalid character in polyline")
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append((lat / factor, lon / factor))
+    return points
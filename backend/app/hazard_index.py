@@ -0,0 +1,322 @@
+"""
+SmartCity Dash - In-Memory Hazard Index
+Grid-bucketed spatial index that answers radius and route-corridor queries
+without a database round trip. Mirrors the output of the
+get_hazards_within_radius and get_hazards_along_route RPCs.
+
+The index is warmed from the hazards table at startup, updated whenever a
+hazard is inserted, and periodically rebuilt to reconcile with the database.
+"""
+
+import heapq
+import math
+import time
+from operator import itemgetter
+from typing import AbstractSet, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.config import settings
+from app.expiry import hazard_expires_at
+from app.geo import METERS_PER_DEG_LAT, haversine_m
+
+
+Cell = Tuple[int, int]
+
+
+def matches_filters(
+    row: Dict[str, Any],
+    hazard_types: Optional[AbstractSet[str]] = None,
+    severity_levels: Optional[AbstractSet[str]] = None,
+) -> bool:
+    """True if the row passes the optional hazard_type / severity_level filters."""
+    return (
+        (hazard_types is None or row.get("hazard_type") in hazard_types)
+        and (severity_levels is None or row.get("severity_level") in severity_levels)
+    )
+
+
+def nearest_first(
+    hits: List[Tuple[float, Dict[str, Any]]], limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Order (distance_m, row) pairs nearest first, keep at most limit, add distance_meters."""
+    if limit is not None and limit < len(hits):
+        hits = heapq.nsmallest(limit, hits, key=itemgetter(0))
+    else:
+        hits.sort(key=itemgetter(0))
+    return [{**row, "distance_meters": int(d)} for d, row in hits]
+
+
+class LatLonGrid:
+    """Fixed-size lat/lon cells; longitude wraps at the antimeridian."""
+
+    def __init__(self, cell_deg: float):
+        self.cell_deg = cell_deg
+        self._lon_cells = max(1, int(round(360.0 / cell_deg)))
+
+    def _cell(self, latitude: float, longitude: float) -> Cell:
+        cy = int(math.floor(latitude / self.cell_deg))
+        cx = int(math.floor((longitude + 180.0) / self.cell_deg)) % self._lon_cells
+        return cy, cx
+
+    def _cells_for_radius(
+        self, latitude: float, longitude: float, radius_m: float,
+    ) -> Iterator[Cell]:
+        dlat = radius_m / METERS_PER_DEG_LAT
+        lat_min = max(-90.0, latitude - dlat)
+        lat_max = min(90.0, latitude + dlat)
+        # Widest longitude span occurs at the bbox edge closest to a pole
+        max_abs_lat = max(abs(lat_min), abs(lat_max))
+        cos_lat = math.cos(math.radians(max_abs_lat))
+        if cos_lat < 1e-6:
+            dlon = 360.0
+        else:
+            dlon = radius_m / (METERS_PER_DEG_LAT * cos_lat)
+
+        cy_min = int(math.floor(lat_min / self.cell_deg))
+        cy_max = int(math.floor(lat_max / self.cell_deg))
+        if dlon >= 180.0:
+            cx_range = range(self._lon_cells)
+        else:
+            cx_min = int(math.floor((longitude - dlon + 180.0) / self.cell_deg))
+            cx_max = int(math.floor((longitude + dlon + 180.0) / self.cell_deg))
+            cx_range = range(cx_min, cx_max + 1)
+
+        for cy in range(cy_min, cy_max + 1):
+            for cx in cx_range:
+                yield cy, cx % self._lon_cells
+
+    def _cells_for_segment(
+        self, lat1: float, lon1: float, lat2: float, lon2: float, margin_m: float,
+    ) -> Iterator[Cell]:
+        """Cells overlapping the segment's bounding box grown by margin_m."""
+        dlat = margin_m / METERS_PER_DEG_LAT
+        lat_min = max(-90.0, min(lat1, lat2) - dlat)
+        lat_max = min(90.0, max(lat1, lat2) + dlat)
+        cos_lat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+        dlon = 360.0 if cos_lat < 1e-6 else margin_m / (METERS_PER_DEG_LAT * cos_lat)
+        # Unwrapped, so a segment crossing the antimeridian stays short
+        span = _wrap_lon(lon2 - lon1)
+        lon_min = lon1 + min(0.0, span) - dlon
+        lon_max = lon1 + max(0.0, span) + dlon
+
+        cy_min = int(math.floor(lat_min / self.cell_deg))
+        cy_max = int(math.floor(lat_max / self.cell_deg))
+        if lon_max - lon_min >= 360.0:
+            cx_range = range(self._lon_cells)
+        else:
+            cx_min = int(math.floor((lon_min + 180.0) / self.cell_deg))
+            cx_max = int(math.floor((lon_max + 180.0) / self.cell_deg))
+            cx_range = range(cx_min, cx_max + 1)
+
+        for cy in range(cy_min, cy_max + 1):
+            for cx in cx_range:
+                yield cy, cx % self._lon_cells
+
+
+def _wrap_lon(delta: float) -> float:
+    """Longitude difference folded into [-180, 180)."""
+    return (delta + 180.0) % 360.0 - 180.0
+
+
+class HazardIndex(LatLonGrid):
+    """
+    Hazards bucketed into fixed-size lat/lon cells.
+
+    A radius query only visits the cells overlapping the query's bounding
+    box, then computes exact distances for the candidates in those cells.
+    """
+
+    def __init__(self, cell_deg: float = 0.05):
+        super().__init__(cell_deg)
+        self._cells: Dict[Cell, Dict[str, Dict[str, Any]]] = {}
+        self._cell_of: Dict[str, Cell] = {}
+        # hazard_id → expiry (epoch seconds) for hazards with a lifetime
+        self._expires_at: Dict[str, float] = {}
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._cell_of)
+
+    def __contains__(self, hazard_id: str) -> bool:
+        return hazard_id in self._cell_of
+
+    # ── Mutation ──────────────────────────────────────────────────────────────
+
+    def add(self, row: Dict[str, Any]) -> None:
+        """Insert or replace a hazard row (as returned by the hazards table)."""
+        hazard_id = str(row.get("id", ""))
+        if not hazard_id:
+            return
+        self.remove(hazard_id)
+        cell = self._cell(float(row["latitude"]), float(row["longitude"]))
+        self._cells.setdefault(cell, {})[hazard_id] = row
+        self._cell_of[hazard_id] = cell
+        expires = hazard_expires_at(row)
+        if expires is not None:
+            self._expires_at[hazard_id] = expires.timestamp()
+
+    def remove(self, hazard_id: str) -> Optional[Dict[str, Any]]:
+        cell = self._cell_of.pop(hazard_id, None)
+        if cell is None:
+            return None
+        self._expires_at.pop(hazard_id, None)
+        bucket = self._cells[cell]
+        row = bucket.pop(hazard_id, None)
+        if not bucket:
+            del self._cells[cell]
+        return row
+
+    def replace_all(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """Rebuild the index from a full snapshot and mark it ready."""
+        self._cells = {}
+        self._cell_of = {}
+        self._expires_at = {}
+        for row in rows:
+            self.add(row)
+        self.ready = True
+
+    def prune_expired(self, now: Optional[float] = None) -> int:
+        """Drop hazards whose lifetime has elapsed; returns how many."""
+        now = time.time() if now is None else now
+        doomed = [h for h, expires in self._expires_at.items() if expires <= now]
+        for hazard_id in doomed:
+            self.remove(hazard_id)
+        return len(doomed)
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        for bucket in self._cells.values():
+            yield from bucket.values()
+
+    def _route_pieces(
+        self, points: Sequence[Tuple[float, float]],
+    ) -> Iterator[Tuple[float, float, float, float]]:
+        """
+        (lat1, lon1, lat2, lon2) for each segment of the route, split into
+        equal pieces no longer than about one cell.
+        """
+        max_piece_m = self.cell_deg * METERS_PER_DEG_LAT
+        for (lat1, lon1), (lat2, lon2) in zip(points, points[1:]):
+            span = _wrap_lon(lon2 - lon1)
+            n = max(1, math.ceil(haversine_m(lat1, lon1, lat2, lon2) / max_piece_m))
+            prev_lat, prev_lon = lat1, lon1
+            for i in range(1, n + 1):
+                f = i / n
+                lat, lon = lat1 + f * (lat2 - lat1), _wrap_lon(lon1 + f * span)
+                yield prev_lat, prev_lon, lat, lon
+                prev_lat, prev_lon = lat, lon
+
+    # ── Queries ───────────────────────────────────────────────────────────────
+
+    def query(
+        self, latitude: float, longitude: float, radius_km: float,
+        hazard_types: Optional[AbstractSet[str]] = None,
+        severity_levels: Optional[AbstractSet[str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return live hazards within radius_km matching the filters, nearest
+        first (at most limit), with distance_meters.
+        """
+        hits = list(self._hits(latitude, longitude, radius_km, hazard_types, severity_levels))
+        return nearest_first(hits, limit)
+
+    def count(
+        self, latitude: float, longitude: float, radius_km: float,
+        hazard_types: Optional[AbstractSet[str]] = None,
+        severity_levels: Optional[AbstractSet[str]] = None,
+    ) -> int:
+        """Number of live hazards within radius_km matching the filters."""
+        return sum(1 for _ in self._hits(latitude, longitude, radius_km, hazard_types, severity_levels))
+
+    def _hits(
+        self, latitude: float, longitude: float, radius_km: float,
+        hazard_types: Optional[AbstractSet[str]],
+        severity_levels: Optional[AbstractSet[str]],
+    ) -> Iterator[Tuple[float, Dict[str, Any]]]:
+        """(distance_m, row) for each live hazard within radius_km matching the filters."""
+        radius_m = radius_km * 1000.0
+        now = time.time()
+        seen = set()
+        for cell in self._cells_for_radius(latitude, longitude, radius_m):
+            if cell in seen:
+                continue
+            seen.add(cell)
+            bucket = self._cells.get(cell)
+            if not bucket:
+                continue
+            for hazard_id, row in bucket.items():
+                expires = self._expires_at.get(hazard_id)
+                if expires is not None and expires <= now:
+                    continue
+                if not matches_filters(row, hazard_types, severity_levels):
+                    continue
+                d = haversine_m(
+                    latitude, longitude,
+                    float(row["latitude"]), float(row["longitude"]),
+                )
+                if d <= radius_m:
+                    yield d, row
+
+    def query_route(
+        self, points: Sequence[Tuple[float, float]], corridor_m: float,
+        hazard_types: Optional[AbstractSet[str]] = None,
+        severity_levels: Optional[AbstractSet[str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return live hazards within corridor_m of the route through points,
+        in order along the route (at most limit), with distance_along_meters
+        and distance_from_route_meters.
+
+        One sweep over the segments: each visits only the cells around it
+        and projects the candidates onto it in a local equirectangular frame.
+        Segments longer than a cell are split first, so a long diagonal
+        visits the cells along its corridor rather than its whole bounding
+        box. A hazard near several segments is placed at the closest one.
+        """
+        now = time.time()
+        # hazard_id → (distance from route, distance along route, row)
+        best: Dict[str, Tuple[float, float, Dict[str, Any]]] = {}
+        along = 0.0
+        for lat1, lon1, lat2, lon2 in self._route_pieces(points):
+            seg_len = haversine_m(lat1, lon1, lat2, lon2)
+            kx = METERS_PER_DEG_LAT * math.cos(math.radians((lat1 + lat2) / 2))
+            dx = _wrap_lon(lon2 - lon1) * kx
+            dy = (lat2 - lat1) * METERS_PER_DEG_LAT
+            seg_sq = dx * dx + dy * dy
+            seen = set()
+            for cell in self._cells_for_segment(lat1, lon1, lat2, lon2, corridor_m):
+                if cell in seen:
+                    continue
+                seen.add(cell)
+                bucket = self._cells.get(cell)
+                if not bucket:
+                    continue
+                for hazard_id, row in bucket.items():
+                    expires = self._expires_at.get(hazard_id)
+                    if expires is not None and expires <= now:
+                        continue
+                    if not matches_filters(row, hazard_types, severity_levels):
+                        continue
+                    px = _wrap_lon(float(row["longitude"]) - lon1) * kx
+                    py = (float(row["latitude"]) - lat1) * METERS_PER_DEG_LAT
+                    t = min(1.0, max(0.0, (px * dx + py * dy) / seg_sq)) if seg_sq else 0.0
+                    off = math.hypot(px - t * dx, py - t * dy)
+                    if off > corridor_m:
+                        continue
+                    prev = best.get(hazard_id)
+                    if prev is None or off < prev[0]:
+                        best[hazard_id] = (off, along + t * seg_len, row)
+            along += seg_len
+
+        if limit is not None and limit < len(best):
+            hits = heapq.nsmallest(limit, best.values(), key=itemgetter(1))
+        else:
+            hits = sorted(best.values(), key=itemgetter(1))
+        return [
+            {**row, "distance_along_meters": int(a), "distance_from_route_meters": int(off)}
+            for off, a, row in hits
+        ]
+
+
+# Global singleton
+hazard_index = HazardIndex(cell_deg=settings.hazard_index_cell_deg)
@@ -0,0 +1,132 @@
+"""
+SmartCity Dash - Hazard Push Stream
+In-process fan-out of newly reported hazards to drivers connected over
+WebSocket (/ws/hazards), replacing the app's 30-second nearby-hazards poll.
+
+Each subscriber is registered in every grid cell its (position, radius)
+circle overlaps, so publishing a hazard only visits the subscribers in that
+hazard's cell and checks exact distance for those.
+
+Message flow on a connection:
+  client → NearbyHazardsRequest body: position, radius, optional filters   (any time the driver moves)
+  server → {"type": "snapshot", "total_count", "radius_km", "hazards"}   (reply to each position)
+  server → {"type": "hazard", "hazard": {...}}   (new or merged hazard inside the area)
+  server → {"type": "resync"}   (deltas were dropped; resend the position)
+  server → {"type": "error", "detail"}   (bad position message)
+"""
+
+import asyncio
+from typing import AbstractSet, Any, Dict, List, Optional, Set
+
+from app.config import settings
+from app.geo import haversine_m
+from app.hazard_index import Cell, LatLonGrid, matches_filters
+from app.models import HazardDetail
+
+
+class HazardSubscriber:
+    """
+    One connected driver: current area plus a bounded outbox.
+
+    While a snapshot is being fetched (syncing), deltas are held back and
+    sent after it, so a hazard reported mid-fetch is never lost to the
+    snapshot replacing the client's list.
+    """
+
+    def __init__(self, max_pending: int):
+        self.latitude: Optional[float] = None
+        self.longitude: Optional[float] = None
+        self.radius_m = 0.0
+        self.hazard_types: Optional[AbstractSet[str]] = None
+        self.severity_levels: Optional[AbstractSet[str]] = None
+        self.cells: Set[Cell] = set()
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.syncing = False
+        self._held: List[Dict[str, Any]] = []
+
+    def push(self, message: Dict[str, Any]) -> None:
+        if self.syncing:
+            self._held.append(message)
+            return
+        try:
+            self.outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow consumer: drop the backlog and ask for a fresh snapshot
+            while not self.outbox.empty():
+                self.outbox.get_nowait()
+            self.outbox.put_nowait({"type": "resync"})
+
+    def finish_sync(self, snapshot: Dict[str, Any]) -> None:
+        self.syncing = False
+        held, self._held = self._held, []
+        self.push(snapshot)
+        for message in held:
+            self.push(message)
+
+
+class HazardSubscriberRegistry(LatLonGrid):
+    def __init__(self, cell_deg: float = 0.1):
+        super().__init__(cell_deg)
+        self._cells: Dict[Cell, Set[HazardSubscriber]] = {}
+        self._subscribers: Set[HazardSubscriber] = set()
+        self.published = 0
+        self.delivered = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def _unlink(self, subscriber: HazardSubscriber) -> None:
+        for cell in subscriber.cells:
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.discard(subscriber)
+                if not bucket:
+                    del self._cells[cell]
+        subscriber.cells = set()
+
+    def move(
+        self, subscriber: HazardSubscriber, latitude: float, longitude: float, radius_km: float,
+    ) -> None:
+        """Register the subscriber, or update its area after a position message."""
+        self._unlink(subscriber)
+        subscriber.latitude = latitude
+        subscriber.longitude = longitude
+        subscriber.radius_m = radius_km * 1000.0
+        subscriber.cells = set(self._cells_for_radius(latitude, longitude, subscriber.radius_m))
+        for cell in subscriber.cells:
+            self._cells.setdefault(cell, set()).add(subscriber)
+        self._subscribers.add(subscriber)
+
+    def unsubscribe(self, subscriber: HazardSubscriber) -> None:
+        self._unlink(subscriber)
+        self._subscribers.discard(subscriber)
+
+    def publish(self, row: Dict[str, Any]) -> int:
+        """Push a hazard row to every subscriber whose area contains it."""
+        self.published += 1
+        latitude = float(row["latitude"])
+        longitude = float(row["longitude"])
+        bucket = self._cells.get(self._cell(latitude, longitude))
+        if not bucket:
+            return 0
+        message = None
+        sent = 0
+        for subscriber in bucket:
+            d = haversine_m(subscriber.latitude, subscriber.longitude, latitude, longitude)
+            if d > subscriber.radius_m:
+                continue
+            if not matches_filters(row, subscriber.hazard_types, subscriber.severity_levels):
+                continue
+            if message is None:
+                message = {
+                    "type": "hazard",
+                    "hazard": HazardDetail.dict_from_db_row(row),
+                }
+            subscriber.push(message)
+            sent += 1
+        self.delivered += sent
+        return sent
+
+
+# Global singleton
+hazard_stream = HazardSubscriberRegistry(cell_deg=settings.hazard_stream_cell_deg)
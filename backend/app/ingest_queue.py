@@ -0,0 +1,160 @@
+"""
+SmartCity Dash - Write-Behind Ingest Queue
+Accepted hazard reports are queued in memory and written to the database in
+multi-row batches by a background flusher, so report latency no longer
+depends on Supabase latency.
+
+The queue is bounded: when it is full, offer() refuses the item and the API
+answers 429 so clients back off. On shutdown, drain() stops intake and
+flushes whatever is still queued.
+
+With DEDUP_ENABLED the flusher writes through insert_hazards_dedup, so a
+queued repeat sighting is merged into the existing hazard rather than
+stored under the id handed out when it was accepted.
+
+Both bulk RPCs accept caller-chosen ids and timestamps, so the database
+only lets authenticated and service_role run them: the queue needs
+SUPABASE_KEY to be the service_role key.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from postgrest.exceptions import APIError
+
+from app.config import settings
+from app.database import insert_hazards, insert_hazards_dedup
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Single-item writes in flight at once when a rejected batch is retried item by item
+_RETRY_CONCURRENCY = 8
+
+
+class HazardIngestQueue:
+    def __init__(self, max_size: int, flush_size: int, flush_interval_seconds: float):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+        self.written = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        """Create the queue and flusher task on the running event loop."""
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._accepting = True
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Ingest queue started — max {self.max_size}, "
+            f"flush {self.flush_size} / {self.flush_interval_seconds}s"
+        )
+
+    def offer(self, item: Dict[str, Any]) -> bool:
+        """Enqueue a scored hazard; returns False when the queue is full or stopped."""
+        if not self._accepting or self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        """Stop intake and wait for everything already queued to be written."""
+        if self._task is None:
+            return
+        self._accepting = False
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Ingest queue drain timed out with {self.qsize()} items left")
+            self._task.cancel()
+        self._task = None
+        logger.info(f"Ingest queue drained — written: {self.written} failed: {self.failed}")
+
+    # ── Flusher ───────────────────────────────────────────────────────────────
+
+    async def _next_batch(self) -> Tuple[List[Dict[str, Any]], bool]:
+        """Wait for one item, then gather more until flush_size or the interval elapses."""
+        loop = asyncio.get_running_loop()
+        first = await self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = loop.time() + self.flush_interval_seconds
+        while len(batch) < self.flush_size:
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+            else:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        write = insert_hazards_dedup if settings.dedup_enabled else insert_hazards
+        try:
+            await write(batch)
+            self.written += len(batch)
+            return
+        except APIError as e:
+            # The database rejected the all-or-nothing batch; retry one by
+            # one to isolate the items that actually fail
+            logger.warning(
+                f"Batch write of {len(batch)} queued hazards rejected ({e.code}), retrying individually"
+            )
+        except Exception as e:
+            # Transport error or timeout: the batch may even have been
+            # written, and a per-item retry would only multiply load on a
+            # struggling database
+            self.failed += len(batch)
+            logger.error(f"Dropping {len(batch)} queued hazards after failed batch write: {e}")
+            return
+        semaphore = asyncio.Semaphore(_RETRY_CONCURRENCY)
+
+        async def write_one(item: Dict[str, Any]) -> Any:
+            async with semaphore:
+                return await write([item])
+
+        results = await asyncio.gather(
+            *(write_one(item) for item in batch), return_exceptions=True,
+        )
+        for item, result in zip(batch, results):
+            if isinstance(result, Exception):
+                self.failed += 1
+                logger.error(f"Dropping queued hazard {item.get('id')}: {result}")
+            else:
+                self.written += 1
+
+    async def _run(self) -> None:
+        while True:
+            batch, stop = await self._next_batch()
+            if batch:
+                await self._flush(batch)
+            if stop:
+                return
+
+
+# Global singleton
+ingest_queue = HazardIngestQueue(
+    max_size=settings.ingest_queue_max_size,
+    flush_size=settings.ingest_flush_size,
+    flush_interval_seconds=settings.ingest_flush_interval_seconds,
+)
@@ -4,33 +4,70 @@ SmartCity Dash - FastAPI Application
 Endpoints:
   GET  /                                   Health check
   POST /api/report-hazard                  Report a detected hazard
+  POST /api/report-hazards                 Report a batch of detected hazards
+  POST /api/report-hazard-image            Report a hazard with a dashcam frame
   POST /api/nearby-hazards                 Get hazards within radius
+  POST /api/nearby-hazards/batch           Get hazards around many points at once
+  POST /api/route-hazards                  Get hazards along a route corridor
+  GET  /api/tiles/{z}/{x}/{y}.mvt          Hazard map as Mapbox Vector Tiles
   GET  /api/driver/{driver_id}/history     Get driver hazard history
   GET  /api/driver/{driver_id}/settings    Get driver profile settings
   PUT  /api/driver/{driver_id}/settings    Update driver profile settings
+  GET  /api/cache-stats                    In-process cache hit ratios
+  WS   /ws/hazards                         Push stream of hazards near the driver
 """
 
+import asyncio
+import base64
+import hashlib
+import json
 import logging
+import uuid
+
+import orjson
 from contextlib import asynccontextmanager
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException, Query, status
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
+from postgrest.exceptions import APIError
+from pydantic import ValidationError
 
 from app.config import settings
 from app.models import (
     ReportHazardRequest, ReportHazardResponse,
+    ReportHazardsRequest, ReportHazardsResponse, BatchItemResult,
     NearbyHazardsRequest, NearbyHazardsResponse,
+    NearbyHazardsBatchRequest, NearbyHazardsBatchResponse,
+    RouteHazardsRequest, RouteHazardsResponse,
     DriverHistoryResponse, DriverSettings,
     UpdateDriverSettingsRequest, HazardDetail, HealthResponse,
+    CacheStats, CacheStatsResponse,
 )
 from app.database import (
-    insert_hazard, get_hazards_within_radius,
-    get_driver_history, count_driver_history,
+    SupabaseClient, refresh_hazard_index, expire_hazards, is_valid_uuid,
+    insert_hazard, insert_hazards, insert_hazard_dedup, insert_hazards_dedup,
+    upload_hazard_photo, delete_hazard_photo,
+    get_hazards_within_radius, query_hazards_within_radius, get_hazards_along_route,
+    get_hazards_near_points, count_hazards_near_points,
+    get_hazard_tile,
+    get_driver_history,
     get_driver_settings, update_driver_settings,
 )
-from app.ai_gateway import analyse_hazard
+from app.ai_gateway import analyse_hazard_async, analyse_hazards_async, inference_engine
+from app.cache import driver_settings_cache, hazard_tile_cache, nearby_hazards_cache
+from app.hazard_stream import HazardSubscriber, hazard_stream
+from app.ingest_queue import ingest_queue
+from app.pg_backend import postgres_backend
+from app.clustering import grid_clusters
+from app.geo import haversine_m
+from app.uploads import UploadTooLarge, probe_image, read_multipart_upload
+from app.compact import (
+    COLUMNAR_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, ROUTE_HAZARD_COLUMNS, hazard_list_response, negotiate_format,
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -54,11 +91,160 @@ def _default_settings(driver_id: str) -> DriverSettings:
     )
 
 
+async def _reconcile_hazard_index():
+    """Periodically rebuild the in-memory hazard index from the database."""
+    while True:
+        await asyncio.sleep(settings.hazard_index_refresh_seconds)
+        await refresh_hazard_index()
+
+
+async def _expire_hazards_periodically():
+    """Flag hazards past their per-type lifetime so the active set stays bounded."""
+    while True:
+        await expire_hazards()
+        await asyncio.sleep(settings.hazard_prune_interval_seconds)
+
+
+def _encode_history_cursor(created_at: str, hazard_id: str, total: int) -> str:
+    """Opaque keyset cursor: position of the last row plus the first page's total."""
+    raw = json.dumps([created_at, hazard_id, total], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_history_cursor(cursor: str) -> Tuple[str, str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, hazard_id, total = json.loads(raw)
+        datetime.fromisoformat(created_at)
+        if not is_valid_uuid(hazard_id) or not isinstance(total, int):
+            raise ValueError
+        return created_at, hazard_id, total
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+
+def _sorted_or_none(values: Optional[List[str]]) -> Optional[List[str]]:
+    return sorted(values) if values else None
+
+
+def _view_digest(hazard_ids: Iterable[str]) -> str:
+    """Short fingerprint of a set of hazard ids."""
+    digest = hashlib.blake2b(digest_size=8)
+    for hazard_id in sorted(hazard_ids):
+        digest.update(hazard_id.encode())
+        digest.update(b",")
+    return digest.hexdigest()
+
+
+def _held_digest(rows: Iterable[Dict[str, Any]], since: datetime) -> str:
+    """
+    Fingerprint of the hazards in a view that were created before since.
+    Later ones are left out, as a delta can't tell them from new arrivals.
+    """
+    return _view_digest(str(r["id"]) for r in rows if not _at_or_after(r.get("created_at"), since))
+
+
+def _encode_sync_token(
+    issued_at: datetime, request: NearbyHazardsRequest, rows: Iterable[Dict[str, Any]], truncated: bool,
+) -> str:
+    """
+    Opaque delta-sync token describing the view (rows) the client now holds:
+    when, for which area, filters and max_results it was built, whether it
+    was truncated, and a fingerprint of its hazards.
+    """
+    raw = json.dumps(
+        [
+            issued_at.isoformat(), request.latitude, request.longitude, request.radius_km,
+            _sorted_or_none(request.hazard_types), _sorted_or_none(request.severity_levels),
+            request.max_results, truncated, _held_digest(rows, issued_at),
+        ],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_sync_token(token: str) -> Dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        (
+            issued_at, latitude, longitude, radius_km, hazard_types, severity_levels,
+            max_results, truncated, digest,
+        ) = json.loads(raw)
+        issued_at = datetime.fromisoformat(issued_at)
+        if issued_at.tzinfo is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError
+        for values in (hazard_types, severity_levels):
+            if values is not None and not all(isinstance(v, str) for v in values):
+                raise ValueError
+        if not isinstance(max_results, int) or not isinstance(truncated, bool) or not isinstance(digest, str):
+            raise ValueError
+        return {
+            "issued_at": issued_at,
+            "latitude": float(latitude),
+            "longitude": float(longitude),
+            "radius_km": float(radius_km),
+            "hazard_types": hazard_types,
+            "severity_levels": severity_levels,
+            "max_results": max_results,
+            "truncated": truncated,
+            "digest": digest,
+        }
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token.")
+
+
+def _bearer_token(request: Request) -> Optional[str]:
+    """The caller's Supabase access token from 'Authorization: Bearer ...', if any."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+
+def _at_or_after(stamp: Any, since: datetime) -> bool:
+    """True if the timestamp is at or after since; unreadable stamps count as recent."""
+    if isinstance(stamp, str):
+        try:
+            stamp = datetime.fromisoformat(stamp)
+        except ValueError:
+            return True
+    if not isinstance(stamp, datetime) or stamp.tzinfo is None:
+        return True
+    return stamp >= since
+
+
+def _changed_since(row: Dict[str, Any], since: datetime) -> bool:
+    """True if the hazard was created or re-reported at or after since."""
+    return _at_or_after(row.get("last_reported_at") or row.get("created_at"), since)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info(f"SmartCity Dash starting — env: {settings.environment}")
+    await SupabaseClient.connect()
+    if postgres_backend.enabled:
+        await postgres_backend.connect()
+    if settings.inference_engine_enabled:
+        inference_engine.start()
+    background = []
+    if settings.hazard_index_enabled:
+        # Cold start; until this succeeds nearby queries fall back to the RPC
+        await refresh_hazard_index()
+        background.append(asyncio.create_task(_reconcile_hazard_index()))
+    if settings.hazard_expiry_enabled:
+        background.append(asyncio.create_task(_expire_hazards_periodically()))
+    if settings.ingest_queue_enabled:
+        ingest_queue.start()
     yield
     logger.info("SmartCity Dash shutting down")
+    if settings.ingest_queue_enabled:
+        await ingest_queue.drain()
+    await inference_engine.stop()
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await postgres_backend.close()
+    await SupabaseClient.close()
 
 
 app = FastAPI(
@@ -66,6 +252,7 @@ app = FastAPI(
     description="Real-time road hazard detection and reporting system",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
 )
@@ -92,6 +279,15 @@ async def health_check():
     return HealthResponse(status="healthy", environment=settings.environment, version="1.0.0")
 
 
+@app.get("/api/cache-stats", response_model=CacheStatsResponse, tags=["System"])
+async def cache_stats():
+    return CacheStatsResponse(
+        nearby_hazards=CacheStats(**nearby_hazards_cache.stats()),
+        driver_settings=CacheStats(**driver_settings_cache.stats()),
+        hazard_tiles=CacheStats(**hazard_tile_cache.stats()),
+    )
+
+
 # ── Report Hazard ─────────────────────────────────────────────────────────────
 
 @app.post(
@@ -100,39 +296,555 @@ async def health_check():
     status_code=status.HTTP_201_CREATED,
     tags=["Hazards"],
 )
-async def report_hazard(request: ReportHazardRequest):
+async def report_hazard(request: ReportHazardRequest, response: Response):
     logger.info(f"Hazard report — driver: {request.driver_id} type: {request.hazard_type}")
-    confidence_score, severity_level = analyse_hazard(request.hazard_type)
+    confidence_score, severity_level = await analyse_hazard_async(request.hazard_type)
+
+    if settings.ingest_queue_enabled:
+        # Write-behind: the id handed out here is the one the flusher stores,
+        # unless dedup merges the report into an existing hazard
+        if not is_valid_uuid(request.driver_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"driver_id '{request.driver_id}' is not a valid UUID",
+            )
+        item = {
+            "id": str(uuid.uuid4()),
+            "driver_id": request.driver_id,
+            "latitude": request.latitude,
+            "longitude": request.longitude,
+            "hazard_type": request.hazard_type,
+            "severity_level": severity_level,
+            "confidence_score": confidence_score,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if not ingest_queue.offer(item):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Hazard ingest queue is full, retry shortly.",
+                headers={"Retry-After": "1"},
+            )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return ReportHazardResponse.from_db_row(item)
+
+    try:
+        if settings.dedup_enabled:
+            row, merged = await insert_hazard_dedup(
+                driver_id=request.driver_id,
+                latitude=request.latitude,
+                longitude=request.longitude,
+                hazard_type=request.hazard_type,
+                severity_level=severity_level,
+                confidence_score=confidence_score,
+            )
+            if merged:
+                # Repeat sighting folded into an existing hazard — nothing created
+                response.status_code = status.HTTP_200_OK
+        else:
+            row = await insert_hazard(
+                driver_id=request.driver_id,
+                latitude=request.latitude,
+                longitude=request.longitude,
+                hazard_type=request.hazard_type,
+                severity_level=severity_level,
+                confidence_score=confidence_score,
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to insert hazard: {e}")
+        raise HTTPException(status_code=500, detail="Failed to save hazard report.")
+    return ReportHazardResponse.from_db_row(row)
+
+
+# ── Report Hazard with Image ──────────────────────────────────────────────────
+
+_IMAGE_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png"}
+
+
+@app.post(
+    "/api/report-hazard-image",
+    response_model=ReportHazardResponse,
+    status_code=status.HTTP_201_CREATED,
+    tags=["Hazards"],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["driver_id", "latitude", "longitude", "hazard_type", "image"],
+                        "properties": {
+                            "driver_id": {"type": "string"},
+                            "latitude": {"type": "number"},
+                            "longitude": {"type": "number"},
+                            "hazard_type": {"type": "string"},
+                            "image": {"type": "string", "format": "binary"},
+                        },
+                    },
+                },
+            },
+        },
+    },
+)
+async def report_hazard_image(request: Request):
+    # The body is parsed by hand so the frame is streamed into one buffer
+    # and oversized uploads are rejected before they are fully read
+    try:
+        fields, image = await read_multipart_upload(
+            request, file_field="image", max_file_bytes=settings.image_max_bytes,
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if image is None or image.size == 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No image uploaded.")
+
+    try:
+        report = ReportHazardRequest.model_validate(fields)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    if not is_valid_uuid(report.driver_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"driver_id '{report.driver_id}' is not a valid UUID",
+        )
+
+    view = image.view
+    try:
+        content_type, width, height = probe_image(view)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    if width > settings.image_max_width or height > settings.image_max_height:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=(
+                f"Image is {width}x{height}; maximum is "
+                f"{settings.image_max_width}x{settings.image_max_height}"
+            ),
+        )
+
+    logger.info(
+        f"Hazard image report — driver: {report.driver_id} type: {report.hazard_type} "
+        f"{width}x{height} {image.size}B"
+    )
+    try:
+        confidence_score, severity_level = await analyse_hazard_async(report.hazard_type, view)
+    except Exception as e:
+        logger.error(f"Image analysis failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to analyse hazard image.")
+
+    # Uploaded only once the frame is known to be usable, and removed again
+    # if the hazard can't be stored, so the bucket holds no orphaned photos
+    # Stored under the driver's folder, which is all their token may write to
+    path = f"{report.driver_id}/{uuid.uuid4()}.{_IMAGE_EXTENSIONS[content_type]}"
+    access_token = _bearer_token(request)
+    try:
+        photo = await upload_hazard_photo(path, view, content_type, access_token)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Failed to store hazard image.")
+
     try:
         row = await insert_hazard(
-            driver_id=request.driver_id,
-            latitude=request.latitude,
-            longitude=request.longitude,
-            hazard_type=request.hazard_type,
+            driver_id=report.driver_id,
+            latitude=report.latitude,
+            longitude=report.longitude,
+            hazard_type=report.hazard_type,
             severity_level=severity_level,
             confidence_score=confidence_score,
+            photo_url=photo,
         )
     except ValueError as e:
+        await delete_hazard_photo(path, access_token)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to insert hazard: {e}")
+        await delete_hazard_photo(path, access_token)
         raise HTTPException(status_code=500, detail="Failed to save hazard report.")
-    return ReportHazardResponse.from_db_row(row)
+    return ReportHazardResponse.from_db_row({**row, "photo_url": photo})
+
+
+# ── Report Hazards (batch) ────────────────────────────────────────────────────
+
+# Single-row inserts in flight at once when a rejected batch is retried item by item
+_BATCH_RETRY_CONCURRENCY = 8
+
+
+@app.post("/api/report-hazards", response_model=ReportHazardsResponse, tags=["Hazards"])
+async def report_hazards(request: ReportHazardsRequest):
+    logger.info(f"Batch hazard report — {len(request.hazards)} items")
+    results: List[Optional[BatchItemResult]] = [None] * len(request.hazards)
+
+    # Validate each item on its own so one bad detection doesn't sink the batch
+    accepted: List[tuple] = []
+    for i, raw in enumerate(request.hazards):
+        try:
+            item = ReportHazardRequest.model_validate(raw)
+        except ValidationError as e:
+            error = "; ".join(err["msg"] for err in e.errors())
+            results[i] = BatchItemResult(index=i, success=False, error=error)
+            continue
+        if not is_valid_uuid(item.driver_id):
+            error = f"driver_id '{item.driver_id}' is not a valid UUID"
+            results[i] = BatchItemResult(index=i, success=False, error=error)
+            continue
+        accepted.append((i, item))
+
+    scores = await analyse_hazards_async([item.hazard_type for _, item in accepted])
+    payload = [
+        {
+            "driver_id": item.driver_id,
+            "latitude": item.latitude,
+            "longitude": item.longitude,
+            "hazard_type": item.hazard_type,
+            "severity_level": severity_level,
+            "confidence_score": confidence_score,
+        }
+        for (_, item), (confidence_score, severity_level) in zip(accepted, scores)
+    ]
+
+    # With dedup on, repeat sightings are merged into the canonical hazard,
+    # which is what the item then reports
+    if settings.dedup_enabled:
+        async def write_batch(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            return [row for row, _ in await insert_hazards_dedup(items)]
+
+        async def write_one(**fields: Any) -> Dict[str, Any]:
+            row, _ = await insert_hazard_dedup(**fields)
+            return row
+    else:
+        write_batch, write_one = insert_hazards, insert_hazard
+
+    rows: List[Any]
+    try:
+        rows = await write_batch(payload)
+    except APIError as e:
+        # The database rejected the all-or-nothing multi-row insert; retry
+        # one by one to isolate the rows that actually fail
+        logger.warning(f"Batch insert rejected ({e.code}), retrying items individually")
+        semaphore = asyncio.Semaphore(_BATCH_RETRY_CONCURRENCY)
+
+        async def insert_one(p: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await write_one(**p)
+
+        rows = await asyncio.gather(*(insert_one(p) for p in payload), return_exceptions=True)
+    except Exception as e:
+        # Transport error or timeout: the batch may even have been written,
+        # and a per-item retry would only multiply load on a struggling
+        # database, so every item fails
+        logger.error(f"Batch insert failed: {e}")
+        rows = [e] * len(payload)
+
+    for (i, _), row in zip(accepted, rows):
+        if isinstance(row, ValueError):
+            results[i] = BatchItemResult(index=i, success=False, error=str(row))
+        elif isinstance(row, Exception):
+            results[i] = BatchItemResult(
+                index=i, success=False, error="Failed to save hazard report.",
+            )
+        else:
+            results[i] = BatchItemResult(
+                index=i, success=True, hazard=HazardDetail.from_db_row(row),
+            )
+
+    success_count = sum(1 for r in results if r.success)
+    return ReportHazardsResponse(
+        total_count=len(results),
+        success_count=success_count,
+        failure_count=len(results) - success_count,
+        results=results,
+    )
 
 
 # ── Nearby Hazards ────────────────────────────────────────────────────────────
 
+_FORMAT_QUERY = Query(
+    default=None, alias="format", pattern="^(json|columnar|msgpack)$",
+    description=(
+        f"Response encoding; columnar ({COLUMNAR_MEDIA_TYPE}) and msgpack ({MSGPACK_MEDIA_TYPE}) "
+        "return column arrays instead of hazard objects. Defaults to the Accept header, else json."
+    ),
+)
+
+
 @app.post("/api/nearby-hazards", response_model=NearbyHazardsResponse, tags=["Hazards"])
-async def nearby_hazards(request: NearbyHazardsRequest):
+async def nearby_hazards(
+    request: NearbyHazardsRequest, http_request: Request, response_format: Optional[str] = _FORMAT_QUERY,
+):
     logger.info(f"Nearby hazards — ({request.latitude}, {request.longitude}) r={request.radius_km}km")
+    issued_at = datetime.now(timezone.utc) - timedelta(seconds=settings.delta_sync_overlap_seconds)
+    fmt = negotiate_format(http_request, response_format)
+    if request.since is not None:
+        return hazard_list_response(await _nearby_hazards_delta(request, issued_at), fmt)
+
     # Returns empty list on error — non-critical for app functionality
     rows = await get_hazards_within_radius(
-        latitude=request.latitude,
-        longitude=request.longitude,
-        radius_km=request.radius_km,
+        request.latitude, request.longitude, request.radius_km, **_nearby_filters(request),
+    )
+    return hazard_list_response(_full_nearby_payload(request, rows, issued_at), fmt)
+
+
+def _nearby_filters(request: NearbyHazardsRequest) -> Dict[str, Any]:
+    """
+    Filter kwargs for the hazard queries; one extra row reveals truncation.
+    Cluster mode summarises every match, so it is not capped.
+    """
+    return {
+        "hazard_types": set(request.hazard_types) if request.hazard_types else None,
+        "severity_levels": set(request.severity_levels) if request.severity_levels else None,
+        "limit": None if request.cluster else request.max_results + 1,
+    }
+
+
+def _nearby_payload(
+    radius_km: float, hazards: List[Dict[str, Any]], truncated: bool = False,
+    delta: bool = False, removed_ids: Optional[List[str]] = None, sync_token: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    A NearbyHazardsResponse as a plain dict. Hazard lists are returned this
+    way, straight to orjson, so trusted rows skip model validation and the
+    response_model re-validation.
+    """
+    return {
+        "total_count": len(hazards),
+        "radius_km": radius_km,
+        "hazards": hazards,
+        "truncated": truncated,
+        "delta": delta,
+        "removed_ids": removed_ids or [],
+        "sync_token": sync_token,
+        "clusters": None,
+    }
+
+
+def _full_nearby_payload(
+    request: NearbyHazardsRequest, rows: List[Dict[str, Any]], issued_at: Optional[datetime],
+) -> Dict[str, Any]:
+    """The whole view; with issued_at, plus a sync token describing it."""
+    if request.cluster:
+        cell_m = request.radius_km * 2000.0 / request.cluster_cells
+        # The client holds clusters, not hazards, so the view counts as truncated
+        sync_token = _encode_sync_token(issued_at, request, [], True) if issued_at else None
+        payload = _nearby_payload(request.radius_km, [], sync_token=sync_token)
+        payload["total_count"] = len(rows)
+        payload["clusters"] = grid_clusters(rows, request.latitude, cell_m)
+        return payload
+    hazards = [HazardDetail.dict_from_db_row(r) for r in rows[:request.max_results]]
+    truncated = len(rows) > request.max_results
+    sync_token = _encode_sync_token(
+        issued_at, request, rows[:request.max_results], truncated,
+    ) if issued_at else None
+    return _nearby_payload(
+        request.radius_km, hazards, truncated=truncated, sync_token=sync_token,
     )
-    hazards = [HazardDetail.from_db_row(r) for r in rows]
-    return NearbyHazardsResponse(total_count=len(hazards), radius_km=request.radius_km, hazards=hazards)
+
+
+async def _nearby_hazards_delta(request: NearbyHazardsRequest, issued_at: datetime) -> Dict[str, Any]:
+    view = _decode_sync_token(request.since)
+    since = view["issued_at"]
+    # A move or a filter change both mean the client's view was a different
+    # query; it is re-run as it was to find what left the view
+    moved = (
+        view["latitude"], view["longitude"], view["radius_km"],
+        view["hazard_types"], view["severity_levels"],
+    ) != (
+        request.latitude, request.longitude, request.radius_km,
+        _sorted_or_none(request.hazard_types), _sorted_or_none(request.severity_levels),
+    )
+    filters = _nearby_filters(request)
+    try:
+        rows = await query_hazards_within_radius(
+            request.latitude, request.longitude, request.radius_km, **filters,
+        )
+        if (
+            view["truncated"] or view["max_results"] != request.max_results
+            or len(rows) > request.max_results
+        ):
+            # What a capped view holds depends on which hazards made the cut,
+            # so it can't be diffed; send the view in full
+            return _full_nearby_payload(request, rows, issued_at)
+        previous = await query_hazards_within_radius(
+            view["latitude"], view["longitude"], view["radius_km"],
+            hazard_types=set(view["hazard_types"]) if view["hazard_types"] else None,
+            severity_levels=set(view["severity_levels"]) if view["severity_levels"] else None,
+            limit=filters["limit"],
+        ) if moved else rows
+    except Exception as e:
+        # An empty result here would read as "everything was removed";
+        # report no changes and hand the old token back instead
+        logger.error(f"Nearby hazards delta failed: {e}")
+        return _nearby_payload(request.radius_km, [], delta=True, sync_token=request.since)
+
+    # The re-run view should still hold everything the client holds. If
+    # not, hazards left it in a way a re-run can't show (expired or
+    # deleted), so send the view in full
+    if _held_digest(previous, since) != view["digest"]:
+        return _full_nearby_payload(request, rows, issued_at)
+
+    current_ids = {str(r["id"]) for r in rows}
+    previous_ids = {str(r["id"]) for r in previous}
+    # Hazards that just entered the area are new to the client whatever their age
+    hazards = [
+        HazardDetail.dict_from_db_row(r) for r in rows
+        if _changed_since(r, since) or (moved and str(r["id"]) not in previous_ids)
+    ]
+    removed_ids = sorted(previous_ids - current_ids)
+    sync_token = _encode_sync_token(issued_at, request, rows, False)
+    return _nearby_payload(
+        request.radius_km, hazards, delta=True, removed_ids=removed_ids, sync_token=sync_token,
+    )
+
+
+@app.post("/api/nearby-hazards/batch", response_model=NearbyHazardsBatchResponse, tags=["Hazards"])
+async def nearby_hazards_batch(request: NearbyHazardsBatchRequest):
+    logger.info(f"Nearby hazards batch — {len(request.points)} points")
+    points = [(p.latitude, p.longitude, p.radius_km) for p in request.points]
+    hazard_types = set(request.hazard_types) if request.hazard_types else None
+    severity_levels = set(request.severity_levels) if request.severity_levels else None
+    results = []
+    # Returns empty results on error — non-critical for app functionality
+    if request.counts_only:
+        counts = await count_hazards_near_points(points, hazard_types, severity_levels)
+        for i, (point, count) in enumerate(zip(request.points, counts)):
+            results.append({
+                "index": i, "driver_id": point.driver_id, "total_count": count,
+                "radius_km": point.radius_km, "hazards": [], "truncated": False,
+            })
+    else:
+        # One extra row per point reveals truncation
+        per_point = await get_hazards_near_points(
+            points, hazard_types, severity_levels, limit=request.max_results + 1,
+        )
+        for i, (point, rows) in enumerate(zip(request.points, per_point)):
+            hazards = [HazardDetail.dict_from_db_row(r) for r in rows[:request.max_results]]
+            results.append({
+                "index": i, "driver_id": point.driver_id, "total_count": len(hazards),
+                "radius_km": point.radius_km, "hazards": hazards,
+                "truncated": len(rows) > request.max_results,
+            })
+    # Plain dicts straight to orjson: no per-row validation or response_model pass
+    return ORJSONResponse({"results": results})
+
+
+# ── Route Hazards ─────────────────────────────────────────────────────────────
+
+@app.post("/api/route-hazards", response_model=RouteHazardsResponse, tags=["Hazards"])
+async def route_hazards(
+    request: RouteHazardsRequest, http_request: Request, response_format: Optional[str] = _FORMAT_QUERY,
+):
+    points = request.points
+    logger.info(f"Route hazards — {len(points)} points, corridor={request.corridor_m}m")
+    fmt = negotiate_format(http_request, response_format)
+    # Returns empty list on error — non-critical for app functionality
+    # One extra row reveals truncation
+    rows = await get_hazards_along_route(
+        request.polyline, request.corridor_m,
+        hazard_types=set(request.hazard_types) if request.hazard_types else None,
+        severity_levels=set(request.severity_levels) if request.severity_levels else None,
+        limit=request.max_results + 1,
+    )
+    route_length_m = sum(
+        haversine_m(lat1, lon1, lat2, lon2) for (lat1, lon1), (lat2, lon2) in zip(points, points[1:])
+    )
+    hazards = [
+        {
+            **HazardDetail.dict_from_db_row(r),
+            "distance_along_meters": int(r["distance_along_meters"]),
+            "distance_from_route_meters": int(r["distance_from_route_meters"]),
+        }
+        for r in rows[:request.max_results]
+    ]
+    return hazard_list_response({
+        "total_count": len(hazards),
+        "corridor_m": request.corridor_m,
+        "route_length_meters": int(route_length_m),
+        "hazards": hazards,
+        "truncated": len(rows) > request.max_results,
+    }, fmt, ROUTE_HAZARD_COLUMNS)
+
+
+# ── Hazard Stream ─────────────────────────────────────────────────────────────
+
+@app.websocket("/ws/hazards")
+async def hazard_stream_ws(websocket: WebSocket):
+    """
+    Push alternative to polling /api/nearby-hazards: send a position
+    (NearbyHazardsRequest body) whenever the driver moves, receive a snapshot
+    for it and then only the hazards reported inside that area.
+    """
+    await websocket.accept()
+    if not settings.hazard_stream_enabled:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    subscriber = HazardSubscriber(max_pending=settings.hazard_stream_max_pending)
+
+    async def send_loop():
+        while True:
+            message = await subscriber.outbox.get()
+            await websocket.send_text(orjson.dumps(message).decode())
+
+    sender = asyncio.create_task(send_loop())
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                position = NearbyHazardsRequest.model_validate_json(text)
+            except ValidationError as e:
+                error = "; ".join(err["msg"] for err in e.errors())
+                subscriber.push({"type": "error", "detail": error})
+                continue
+            # Register the new area before fetching so nothing reported
+            # during the fetch is missed; those deltas follow the snapshot
+            subscriber.syncing = True
+            hazard_stream.move(subscriber, position.latitude, position.longitude, position.radius_km)
+            filters = _nearby_filters(position)
+            subscriber.hazard_types = filters["hazard_types"]
+            subscriber.severity_levels = filters["severity_levels"]
+            rows = await get_hazards_within_radius(
+                position.latitude, position.longitude, position.radius_km, **filters,
+            )
+            snapshot = _full_nearby_payload(position, rows, issued_at=None)
+            subscriber.finish_sync({"type": "snapshot", **snapshot})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hazard_stream.unsubscribe(subscriber)
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+
+
+# ── Hazard Vector Tiles ───────────────────────────────────────────────────────
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+
+@app.get("/api/tiles/{z}/{x}/{y}.mvt", tags=["Hazards"])
+async def hazard_tile(z: int, x: int, y: int, http_request: Request):
+    """
+    Live hazards in web-mercator tile z/x/y. Below TILE_CLUSTER_BELOW_ZOOM
+    the tile holds grid clusters (layer "hazard_clusters"), from it upwards
+    individual hazards (layer "hazards").
+    """
+    if not 0 <= z <= settings.tile_max_zoom or not (0 <= x < 1 << z and 0 <= y < 1 << z):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tile out of range.")
+    try:
+        etag, data = await get_hazard_tile(z, x, y)
+    except Exception as e:
+        logger.error(f"Hazard tile {z}/{x}/{y} failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Hazard tiles are temporarily unavailable.",
+        )
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={int(settings.tile_cache_ttl_seconds)}",
+    }
+    if http_request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(data, media_type=MVT_MEDIA_TYPE, headers=headers)
 
 
 # ── Driver History ────────────────────────────────────────────────────────────
@@ -140,15 +852,46 @@ async def nearby_hazards(request: NearbyHazardsRequest):
 @app.get("/api/driver/{driver_id}/history", response_model=DriverHistoryResponse, tags=["Driver"])
 async def get_driver_history_endpoint(
     driver_id: str,
+    http_request: Request,
     limit: int = Query(default=100, ge=1, le=500),
     offset: int = Query(default=0, ge=0),
+    cursor: Optional[str] = Query(
+        default=None,
+        description="next_cursor from the previous page; takes precedence over offset",
+    ),
+    estimate_count: bool = Query(
+        default=False,
+        description="Use the planner's row estimate for large totals instead of an exact count",
+    ),
+    response_format: Optional[str] = _FORMAT_QUERY,
 ):
     logger.info(f"History — driver: {driver_id}")
+    fmt = negotiate_format(http_request, response_format)
     # Always returns 200 with empty list for missing/invalid drivers
-    rows = await get_driver_history(driver_id=driver_id, limit=limit, offset=offset)
-    total = await count_driver_history(driver_id)
-    hazards = [HazardDetail.from_db_row(r) for r in rows]
-    return DriverHistoryResponse(total_count=total, hazards=hazards)
+    # One extra row is fetched to tell whether another page exists
+    if cursor is not None:
+        created_at, hazard_id, total = _decode_history_cursor(cursor)
+        rows, _ = await get_driver_history(
+            driver_id=driver_id, limit=limit + 1,
+            after=(created_at, hazard_id), include_count=False,
+        )
+    else:
+        rows, total = await get_driver_history(
+            driver_id=driver_id, limit=limit + 1, offset=offset, estimate_count=estimate_count,
+        )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_history_cursor(str(last["created_at"]), str(last["id"]), total)
+
+    # Plain dicts straight to orjson: no per-row validation or response_model pass
+    return hazard_list_response({
+        "total_count": total,
+        "hazards": [HazardDetail.dict_from_db_row(r) for r in rows],
+        "next_cursor": next_cursor,
+    }, fmt)
 
 
 # ── Get Driver Settings ───────────────────────────────────────────────────────
@@ -167,21 +910,35 @@ async def get_driver_settings_endpoint(driver_id: str):
 # ── Update Driver Settings ────────────────────────────────────────────────────
 
 @app.put("/api/driver/{driver_id}/settings", response_model=DriverSettings, tags=["Driver"])
-async def update_driver_settings_endpoint(driver_id: str, request: UpdateDriverSettingsRequest):
+async def update_driver_settings_endpoint(
+    driver_id: str, request: UpdateDriverSettingsRequest, http_request: Request,
+):
     logger.info(f"Settings update — driver: {driver_id}")
     if not request.has_any_field():
         raise HTTPException(status_code=400, detail="No settings fields provided.")
 
+    access_token = _bearer_token(http_request)
     update_payload = request.model_dump(exclude_none=True)
-    row = await update_driver_settings(driver_id=driver_id, settings_data=update_payload)
+    try:
+        row = await update_driver_settings(
+            driver_id=driver_id, settings_data=update_payload, access_token=access_token,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        if getattr(e, "code", None) == "42501":
+            if access_token is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Send the driver's Supabase access token as 'Authorization: Bearer <token>'.",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to change this driver's settings.",
+            )
+        raise HTTPException(status_code=500, detail="Failed to save driver settings.")
 
     if row is None:
-        # DB update failed (RLS / invalid UUID) — echo back the requested values as defaults
-        logger.warning(f"Could not persist settings for {driver_id}, echoing back")
-        defaults = _default_settings(driver_id)
-        for field, val in update_payload.items():
-            if hasattr(defaults, field):
-                setattr(defaults, field, val)
-        return defaults
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Driver not found.")
 
     return DriverSettings.from_db_row(row)
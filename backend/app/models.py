@@ -3,11 +3,14 @@ SmartCity Dash - Pydantic Models
 Request and response schemas for all API endpoints.
 """
 
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
+from typing import Any, Dict, Optional, List, Tuple
 from datetime import datetime
 import uuid
 
+from app.expiry import hazard_expires_at
+from app.geo import decode_polyline, haversine_m
+
 
 # ── Hazard Types & Severity ───────────────────────────────────────────────────
 
@@ -22,6 +25,37 @@ VALID_HAZARD_TYPES = {
 
 VALID_SEVERITY_LEVELS = {"low", "medium", "high", "critical"}
 
+MAX_BATCH_HAZARDS = 500
+
+DEFAULT_NEARBY_RESULTS = 500
+MAX_NEARBY_RESULTS = 2000
+
+MAX_BATCH_POINTS = 500
+
+MAX_ROUTE_POINTS = 5000
+MAX_ROUTE_CORRIDOR_M = 500.0
+MAX_ROUTE_LENGTH_KM = 1000.0
+
+
+def _check_hazard_types(v: Optional[List[str]]) -> Optional[List[str]]:
+    if v is not None:
+        invalid = sorted(set(v) - VALID_HAZARD_TYPES)
+        if invalid:
+            raise ValueError(
+                f"Invalid hazard_types {invalid}. Must be among: {', '.join(sorted(VALID_HAZARD_TYPES))}"
+            )
+    return v
+
+
+def _check_severity_levels(v: Optional[List[str]]) -> Optional[List[str]]:
+    if v is not None:
+        invalid = sorted(set(v) - VALID_SEVERITY_LEVELS)
+        if invalid:
+            raise ValueError(
+                f"Invalid severity_levels {invalid}. Must be among: {', '.join(sorted(VALID_SEVERITY_LEVELS))}"
+            )
+    return v
+
 
 # ── Request Models ─────────────────────────────────────────────────────────────
 
@@ -50,12 +84,141 @@ class ReportHazardRequest(BaseModel):
         return v
 
 
+class ReportHazardsRequest(BaseModel):
+    """Request body for POST /api/report-hazards"""
+    hazards: List[Dict[str, Any]] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_HAZARDS,
+        description="ReportHazardRequest objects; each item is validated on its own",
+    )
+
+
 class NearbyHazardsRequest(BaseModel):
     """Request body for POST /api/nearby-hazards"""
     driver_id: str = Field(..., description="UUID of the requesting driver")
     latitude: float = Field(..., ge=-90, le=90)
     longitude: float = Field(..., ge=-180, le=180)
     radius_km: float = Field(default=2.0, ge=0.1, le=50.0, description="Search radius in kilometres")
+    hazard_types: Optional[List[str]] = Field(
+        default=None, min_length=1, description="Only return hazards of these types",
+    )
+    severity_levels: Optional[List[str]] = Field(
+        default=None, min_length=1, description="Only return hazards with these severity levels",
+    )
+    max_results: int = Field(
+        default=DEFAULT_NEARBY_RESULTS, ge=1, le=MAX_NEARBY_RESULTS,
+        description="Return at most this many hazards, nearest first",
+    )
+    since: Optional[str] = Field(
+        default=None, description="sync_token from a previous response; returns only what changed since then",
+    )
+    cluster: bool = Field(
+        default=False, description="Return grid clusters of all matching hazards instead of a hazard list",
+    )
+    cluster_cells: int = Field(
+        default=16, ge=2, le=64, description="Grid cells across the search diameter in cluster mode",
+    )
+
+    @field_validator("cluster")
+    @classmethod
+    def validate_cluster(cls, v: bool, info: ValidationInfo) -> bool:
+        if v and info.data.get("since") is not None:
+            raise ValueError("cluster cannot be combined with since")
+        return v
+
+    @field_validator("hazard_types")
+    @classmethod
+    def validate_hazard_types(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        return _check_hazard_types(v)
+
+    @field_validator("severity_levels")
+    @classmethod
+    def validate_severity_levels(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        return _check_severity_levels(v)
+
+
+class NearbyPoint(BaseModel):
+    """One vehicle position in a batch nearby-hazards request."""
+    driver_id: str = Field(..., description="UUID of the driver at this position")
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    radius_km: float = Field(default=2.0, ge=0.1, le=50.0, description="Search radius in kilometres")
+
+
+class NearbyHazardsBatchRequest(BaseModel):
+    """Request body for POST /api/nearby-hazards/batch"""
+    points: List[NearbyPoint] = Field(..., min_length=1, max_length=MAX_BATCH_POINTS)
+    hazard_types: Optional[List[str]] = Field(
+        default=None, min_length=1, description="Only return hazards of these types",
+    )
+    severity_levels: Optional[List[str]] = Field(
+        default=None, min_length=1, description="Only return hazards with these severity levels",
+    )
+    max_results: int = Field(
+        default=DEFAULT_NEARBY_RESULTS, ge=1, le=MAX_NEARBY_RESULTS,
+        description="Return at most this many hazards per point, nearest first",
+    )
+    counts_only: bool = Field(
+        default=False, description="Return only each point's total_count, uncapped, with no hazard list",
+    )
+
+    @field_validator("hazard_types")
+    @classmethod
+    def validate_hazard_types(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        return _check_hazard_types(v)
+
+    @field_validator("severity_levels")
+    @classmethod
+    def validate_severity_levels(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        return _check_severity_levels(v)
+
+
+class RouteHazardsRequest(BaseModel):
+    """Request body for POST /api/route-hazards"""
+    driver_id: str = Field(..., description="UUID of the requesting driver")
+    polyline: str = Field(
+        ..., min_length=2, description="Route as an encoded polyline (Google algorithm, precision 5)",
+    )
+    corridor_m: float = Field(
+        default=50.0, ge=5.0, le=MAX_ROUTE_CORRIDOR_M,
+        description="Distance either side of the route to search, in metres",
+    )
+    hazard_types: Optional[List[str]] = Field(
+        default=None, min_length=1, description="Only return hazards of these types",
+    )
+    severity_levels: Optional[List[str]] = Field(
+        default=None, min_length=1, description="Only return hazards with these severity levels",
+    )
+    max_results: int = Field(
+        default=DEFAULT_NEARBY_RESULTS, ge=1, le=MAX_NEARBY_RESULTS,
+        description="Return at most this many hazards, first along the route first",
+    )
+
+    @field_validator("polyline")
+    @classmethod
+    def validate_polyline(cls, v: str) -> str:
+        points = decode_polyline(v)
+        if not 2 <= len(points) <= MAX_ROUTE_POINTS:
+            raise ValueError(f"polyline must have between 2 and {MAX_ROUTE_POINTS} points")
+        if any(not (-90 <= lat <= 90 and -180 <= lon <= 180) for lat, lon in points):
+            raise ValueError("polyline has points outside valid coordinates")
+        length_m = sum(haversine_m(*a, *b) for a, b in zip(points, points[1:]))
+        if length_m > MAX_ROUTE_LENGTH_KM * 1000.0:
+            raise ValueError(f"route must be at most {MAX_ROUTE_LENGTH_KM:g} km long")
+        return v
+
+    @property
+    def points(self) -> List[Tuple[float, float]]:
+        return decode_polyline(self.polyline)
+
+    @field_validator("hazard_types")
+    @classmethod
+    def validate_hazard_types(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        return _check_hazard_types(v)
+
+    @field_validator("severity_levels")
+    @classmethod
+    def validate_severity_levels(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        return _check_severity_levels(v)
 
 
 class UpdateDriverSettingsRequest(BaseModel):
@@ -85,25 +248,41 @@ class HazardDetail(BaseModel):
     latitude: float
     longitude: float
     created_at: str
+    report_count: int = 1
+    photo_url: Optional[str] = None
+    expires_at: Optional[str] = None
 
     @classmethod
     def from_db_row(cls, row: dict) -> "HazardDetail":
         """Build a HazardDetail from a Supabase row dict."""
+        return cls(**cls.dict_from_db_row(row))
+
+    @staticmethod
+    def dict_from_db_row(row: dict) -> Dict[str, Any]:
+        """
+        The JSON-ready fields of a HazardDetail, with the same coercions as
+        from_db_row but no validation. Fast path for serializing many
+        trusted rows straight from the database.
+        """
         # Normalise created_at to ISO string
         created = row.get("created_at", "")
         if isinstance(created, datetime):
             created = created.isoformat()
+        expires = hazard_expires_at(row)
 
-        return cls(
-            id=str(row.get("id", "")),
-            driver_id=str(row.get("driver_id", "")),
-            hazard_type=str(row.get("hazard_type", "")),
-            severity_level=str(row.get("severity_level", "medium")),
-            confidence_score=float(row.get("confidence_score", 0.0)),
-            latitude=float(row.get("latitude", 0.0)),
-            longitude=float(row.get("longitude", 0.0)),
-            created_at=str(created),
-        )
+        return {
+            "id": str(row.get("id", "")),
+            "driver_id": str(row.get("driver_id", "")),
+            "hazard_type": str(row.get("hazard_type", "")),
+            "severity_level": str(row.get("severity_level", "medium")),
+            "confidence_score": float(row.get("confidence_score", 0.0)),
+            "latitude": float(row.get("latitude", 0.0)),
+            "longitude": float(row.get("longitude", 0.0)),
+            "created_at": str(created),
+            "report_count": int(row.get("report_count") or 1),
+            "photo_url": row.get("photo_url"),
+            "expires_at": expires.isoformat() if expires is not None else None,
+        }
 
 
 class ReportHazardResponse(HazardDetail):
@@ -111,17 +290,95 @@ class ReportHazardResponse(HazardDetail):
     pass
 
 
+class BatchItemResult(BaseModel):
+    """Outcome for one item of a batch request."""
+    index: int
+    success: bool
+    hazard: Optional[HazardDetail] = None
+    error: Optional[str] = None
+
+
+class ReportHazardsResponse(BaseModel):
+    """Response for POST /api/report-hazards."""
+    total_count: int
+    success_count: int
+    failure_count: int
+    results: List[BatchItemResult]
+
+
+class HazardCluster(BaseModel):
+    """A grid cell of hazards in a clustered nearby-hazards response."""
+    latitude: float
+    longitude: float
+    count: int
+    severity_level: str = Field(..., description="Worst severity in the cluster")
+    hazard_type: str = Field(..., description="Most common hazard type in the cluster")
+    hazard_id: Optional[str] = Field(default=None, description="Set when the cluster is a single hazard")
+
+
 class NearbyHazardsResponse(BaseModel):
-    """Response for POST /api/nearby-hazards."""
+    """
+    Response for POST /api/nearby-hazards.
+
+    With delta=True, hazards holds only the new or changed hazards (to be
+    upserted by id) and removed_ids the ones to drop; otherwise hazards is
+    the full list. Clients drop hazards past their expires_at themselves.
+    With cluster=True, hazards is empty and clusters summarises all
+    total_count matching hazards.
+    """
     total_count: int
     radius_km: float
     hazards: List[HazardDetail]
+    clusters: Optional[List[HazardCluster]] = None
+    truncated: bool = Field(
+        default=False, description="More hazards matched than max_results; only the nearest were returned",
+    )
+    delta: bool = False
+    removed_ids: List[str] = Field(default_factory=list)
+    sync_token: Optional[str] = Field(
+        default=None, description="Pass as since on the next request to receive only changes",
+    )
+
+
+class NearbyPointResult(BaseModel):
+    """Hazards around one point of a batch nearby-hazards request."""
+    index: int
+    driver_id: str
+    total_count: int
+    radius_km: float
+    hazards: List[HazardDetail] = Field(default_factory=list)
+    truncated: bool = False
+
+
+class NearbyHazardsBatchResponse(BaseModel):
+    """Response for POST /api/nearby-hazards/batch; results in request order."""
+    results: List[NearbyPointResult]
+
+
+class RouteHazard(HazardDetail):
+    """A hazard in a route-hazards response, placed on the route."""
+    distance_along_meters: int
+    distance_from_route_meters: int
+
+
+class RouteHazardsResponse(BaseModel):
+    """Response for POST /api/route-hazards; hazards in order along the route."""
+    total_count: int
+    corridor_m: float
+    route_length_meters: int
+    hazards: List[RouteHazard]
+    truncated: bool = Field(
+        default=False, description="More hazards matched than max_results; only the first along the route were returned",
+    )
 
 
 class DriverHistoryResponse(BaseModel):
     """Response for GET /api/driver/{driver_id}/history."""
     total_count: int
     hazards: List[HazardDetail]
+    next_cursor: Optional[str] = Field(
+        default=None, description="Pass as ?cursor= to fetch the next page; null on the last page",
+    )
 
 
 class DriverSettings(BaseModel):
@@ -154,6 +411,24 @@ class DriverSettings(BaseModel):
         )
 
 
+class CacheStats(BaseModel):
+    """Hit/miss accounting for one in-process cache."""
+    hits: int
+    misses: int
+    hit_ratio: float
+    size: int
+    max_entries: int
+    evictions: int
+    invalidations: int
+
+
+class CacheStatsResponse(BaseModel):
+    """Response for GET /api/cache-stats."""
+    nearby_hazards: CacheStats
+    driver_settings: CacheStats
+    hazard_tiles: CacheStats
+
+
 class HealthResponse(BaseModel):
     """Response for GET /"""
     status: str
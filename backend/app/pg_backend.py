@@ -0,0 +1,286 @@
+"""
+SmartCity Dash - Direct Postgres Backend
+Talks to Postgres over an asyncpg connection pool for the hot paths
+(insert_hazard, radius, batch and route queries, vector tiles, driver
+history), skipping the PostgREST HTTP hop and its JSON re-encoding. Selected with
+STORAGE_BACKEND=asyncpg and DATABASE_URL; PostgREST stays the default and
+still serves everything else. Experimental: check a database with
+smoke_pg_backend.py before switching over.
+
+Statements are prepared once per pooled connection (asyncpg's statement
+cache) and reused. Behind a transaction-mode pooler, which can't keep
+prepared statements, set DATABASE_STATEMENT_CACHE_SIZE=0.
+
+Rows come back shaped like PostgREST's JSON (UUIDs and timestamps as
+strings, numerics as floats), so callers don't care which backend served them.
+"""
+
+import json
+import logging
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.config import settings
+
+try:
+    import asyncpg
+except ImportError:  # optional dependency, only needed for STORAGE_BACKEND=asyncpg
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+
+_INSERT_HAZARD_SQL = """
+SELECT * FROM insert_hazard(
+    $1::uuid, $2::float8::numeric, $3::float8::numeric,
+    $4::text, $5::text, $6::float8::numeric, $7::text
+)
+"""
+
+_HAZARDS_WITHIN_RADIUS_SQL = """
+SELECT * FROM get_hazards_within_radius(
+    $1::float8::numeric, $2::float8::numeric, $3::float8::numeric,
+    $4::jsonb, $5::timestamptz, $6::text[], $7::text[], $8::int
+)
+"""
+
+_HAZARDS_NEAR_POINTS_SQL = """
+SELECT * FROM get_hazards_near_points(
+    $1::float8[]::numeric[], $2::float8[]::numeric[], $3::float8[]::numeric[],
+    $4::jsonb, $5::timestamptz, $6::text[], $7::text[], $8::int
+)
+"""
+
+_COUNT_HAZARDS_NEAR_POINTS_SQL = """
+SELECT * FROM count_hazards_near_points(
+    $1::float8[]::numeric[], $2::float8[]::numeric[], $3::float8[]::numeric[],
+    $4::jsonb, $5::timestamptz, $6::text[], $7::text[]
+)
+"""
+
+_HAZARDS_ALONG_ROUTE_SQL = """
+SELECT * FROM get_hazards_along_route(
+    $1::text, $2::float8::numeric, $3::jsonb, $4::timestamptz, $5::text[], $6::text[], $7::int
+)
+"""
+
+_HAZARD_TILE_SQL = """
+SELECT get_hazard_tile($1::int, $2::int, $3::int, $4::int, $5::int, $6::jsonb, $7::timestamptz)
+"""
+
+_HISTORY_COLUMNS = (
+    "id, driver_id, hazard_type, severity_level, confidence_score, latitude, longitude, "
+    "description, photo_url, report_count, last_reported_at, expired, created_at, updated_at"
+)
+
+_HISTORY_PAGE_SQL = f"""
+SELECT {_HISTORY_COLUMNS} FROM hazards
+WHERE driver_id = $1::uuid
+ORDER BY created_at DESC, id DESC
+LIMIT $2 OFFSET $3
+"""
+
+# Row comparison walks idx_hazards_driver_created_id from the cursor onwards
+_HISTORY_AFTER_SQL = f"""
+SELECT {_HISTORY_COLUMNS} FROM hazards
+WHERE driver_id = $1::uuid AND (created_at, id) < ($2::timestamptz, $3::uuid)
+ORDER BY created_at DESC, id DESC
+LIMIT $4
+"""
+
+_HISTORY_COUNT_SQL = "SELECT count(*) FROM hazards WHERE driver_id = $1::uuid"
+
+_HISTORY_ESTIMATE_SQL = "EXPLAIN (FORMAT JSON) SELECT 1 FROM hazards WHERE driver_id = $1::uuid"
+
+# Below this planner estimate an exact count is cheap enough to take
+_EXACT_COUNT_THRESHOLD = 1000
+
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _record_to_dict(record: "asyncpg.Record") -> Dict[str, Any]:
+    return {key: _to_json_value(value) for key, value in record.items()}
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+class PostgresBackend:
+    """Process-wide asyncpg pool; opened by connect() in the app lifespan."""
+
+    def __init__(self, dsn: str, min_size: int, max_size: int, statement_cache_size: int):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self._pool: Optional["asyncpg.Pool"] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.storage_backend == "asyncpg"
+
+    async def connect(self) -> None:
+        if self._pool is not None:
+            return
+        if asyncpg is None:
+            raise RuntimeError("STORAGE_BACKEND=asyncpg requires the asyncpg package")
+        if not self.dsn:
+            raise RuntimeError("STORAGE_BACKEND=asyncpg requires DATABASE_URL")
+        self._pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=self.statement_cache_size,
+        )
+        logger.info(f"Postgres pool opened — {self.min_size}-{self.max_size} connections")
+
+    async def close(self) -> None:
+        if self._pool is None:
+            return
+        await self._pool.close()
+        self._pool = None
+        logger.info("Postgres pool closed")
+
+    @property
+    def pool(self) -> "asyncpg.Pool":
+        if self._pool is None:
+            raise RuntimeError("Postgres backend is not connected")
+        return self._pool
+
+    # ── Hazards ───────────────────────────────────────────────────────────────
+
+    async def insert_hazard(
+        self, driver_id: str, latitude: float, longitude: float,
+        hazard_type: str, severity_level: str, confidence_score: float,
+        photo_url: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        record = await self.pool.fetchrow(
+            _INSERT_HAZARD_SQL,
+            driver_id, latitude, longitude, hazard_type, severity_level, confidence_score, photo_url,
+        )
+        return _record_to_dict(record) if record is not None else None
+
+    async def hazards_within_radius(
+        self, latitude: float, longitude: float, radius_km: float,
+        lifetimes: Optional[Dict[str, float]] = None,
+        created_after: Optional[str] = None,
+        hazard_types: Optional[Sequence[str]] = None,
+        severity_levels: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        records = await self.pool.fetch(
+            _HAZARDS_WITHIN_RADIUS_SQL,
+            latitude, longitude, radius_km,
+            json.dumps(lifetimes) if lifetimes is not None else None,
+            _parse_timestamp(created_after),
+            list(hazard_types) if hazard_types is not None else None,
+            list(severity_levels) if severity_levels is not None else None,
+            limit,
+        )
+        return [_record_to_dict(r) for r in records]
+
+    async def hazards_near_points(
+        self, points: Sequence[Tuple[float, float, float]],
+        lifetimes: Optional[Dict[str, float]] = None,
+        created_after: Optional[str] = None,
+        hazard_types: Optional[Sequence[str]] = None,
+        severity_levels: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+        counts_only: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Rows of get_hazards_near_points, or of count_hazards_near_points with counts_only."""
+        latitudes, longitudes, radii_km = (list(c) for c in zip(*points))
+        args = [
+            latitudes, longitudes, radii_km,
+            json.dumps(lifetimes) if lifetimes is not None else None,
+            _parse_timestamp(created_after),
+            list(hazard_types) if hazard_types is not None else None,
+            list(severity_levels) if severity_levels is not None else None,
+        ]
+        if counts_only:
+            records = await self.pool.fetch(_COUNT_HAZARDS_NEAR_POINTS_SQL, *args)
+        else:
+            records = await self.pool.fetch(_HAZARDS_NEAR_POINTS_SQL, *args, limit)
+        return [_record_to_dict(r) for r in records]
+
+    async def hazards_along_route(
+        self, polyline: str, corridor_m: float,
+        lifetimes: Optional[Dict[str, float]] = None,
+        created_after: Optional[str] = None,
+        hazard_types: Optional[Sequence[str]] = None,
+        severity_levels: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        records = await self.pool.fetch(
+            _HAZARDS_ALONG_ROUTE_SQL,
+            polyline, corridor_m,
+            json.dumps(lifetimes) if lifetimes is not None else None,
+            _parse_timestamp(created_after),
+            list(hazard_types) if hazard_types is not None else None,
+            list(severity_levels) if severity_levels is not None else None,
+            limit,
+        )
+        return [_record_to_dict(r) for r in records]
+
+    async def hazard_tile(
+        self, z: int, x: int, y: int, cluster_below_zoom: int, cluster_cells: int,
+        lifetimes: Optional[Dict[str, float]] = None,
+        created_after: Optional[str] = None,
+    ) -> bytes:
+        tile = await self.pool.fetchval(
+            _HAZARD_TILE_SQL,
+            z, x, y, cluster_below_zoom, cluster_cells,
+            json.dumps(lifetimes) if lifetimes is not None else None,
+            _parse_timestamp(created_after),
+        )
+        return bytes(tile or b"")
+
+    # ── Driver History ────────────────────────────────────────────────────────
+
+    async def driver_history(
+        self, driver_id: str, limit: int, offset: int = 0,
+        after: Optional[Tuple[str, str]] = None,
+        include_count: bool = True, estimate_count: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Same contract as database.get_driver_history: (rows, total or None)."""
+        async with self.pool.acquire() as conn:
+            if after is not None:
+                created_at, hazard_id = after
+                records = await conn.fetch(
+                    _HISTORY_AFTER_SQL, driver_id, _parse_timestamp(created_at), hazard_id, limit,
+                )
+            else:
+                records = await conn.fetch(_HISTORY_PAGE_SQL, driver_id, limit, offset)
+            total = None
+            if include_count:
+                total = await self._count_history(conn, driver_id, estimate_count)
+        return [_record_to_dict(r) for r in records], total
+
+    @staticmethod
+    async def _count_history(conn: "asyncpg.Connection", driver_id: str, estimate: bool) -> int:
+        if estimate:
+            plan = json.loads(await conn.fetchval(_HISTORY_ESTIMATE_SQL, driver_id))
+            estimated = int(plan[0]["Plan"]["Plan Rows"])
+            if estimated >= _EXACT_COUNT_THRESHOLD:
+                return estimated
+        return int(await conn.fetchval(_HISTORY_COUNT_SQL, driver_id))
+
+
+# Global singleton
+postgres_backend = PostgresBackend(
+    dsn=settings.database_url,
+    min_size=settings.database_pool_min_size,
+    max_size=settings.database_pool_max_size,
+    statement_cache_size=settings.database_statement_cache_size,
+)
@@ -0,0 +1,180 @@
+"""
+SmartCity Dash - Image Uploads
+Streaming multipart parsing for dashcam frames, plus header-only image probing.
+
+The request body is parsed as it arrives: form fields are collected as small
+strings and the image part is written straight into a single preallocated
+buffer, so a frame is held in Python memory exactly once. Callers get a
+memoryview over that buffer for inference and storage upload.
+"""
+
+import struct
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+
+MAX_FIELD_BYTES = 1024
+
+JPEG_CONTENT_TYPE = "image/jpeg"
+PNG_CONTENT_TYPE = "image/png"
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers carry the frame dimensions (C4/C8/CC are not SOFs)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class ImageUpload:
+    """An uploaded file held in one buffer; view exposes it without copying."""
+
+    def __init__(self, field_name: str, filename: str, content_type: str, buffer: bytearray, size: int):
+        self.field_name = field_name
+        self.filename = filename
+        self.content_type = content_type
+        self.buffer = buffer
+        self.size = size
+
+    @property
+    def view(self) -> memoryview:
+        return memoryview(self.buffer)[:self.size]
+
+
+async def read_multipart_upload(
+    request: Request, file_field: str, max_file_bytes: int,
+) -> Tuple[Dict[str, str], Optional[ImageUpload]]:
+    """
+    Stream a multipart/form-data body into (text fields, file).
+
+    Raises UploadTooLarge as soon as the file part exceeds max_file_bytes,
+    without reading the rest of the body, and ValueError for malformed input.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise ValueError("Expected a multipart/form-data body")
+
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > max_file_bytes + 64 * 1024:
+        raise UploadTooLarge(f"Upload exceeds {max_file_bytes} bytes")
+    # Content-Length (bounded by the cap) is a good guess at the file size
+    capacity = min(int(declared), max_file_bytes) if declared and declared.isdigit() else 64 * 1024
+
+    fields: Dict[str, str] = {}
+    upload: Dict[str, object] = {}
+    state: Dict[str, object] = {}
+
+    def on_part_begin() -> None:
+        state.clear()
+        state["headers"] = {}
+        state["header_field"] = b""
+        state["header_value"] = b""
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        state["header_value"] += data[start:end]
+
+    def on_header_end() -> None:
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = b""
+        state["header_value"] = b""
+
+    def on_headers_finished() -> None:
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("utf-8", "replace")
+        state["name"] = name
+        if name == file_field and b"filename" in disposition:
+            if "buffer" in upload:
+                raise ValueError(f"Multiple '{file_field}' parts")
+            upload["buffer"] = bytearray(capacity)
+            upload["size"] = 0
+            upload["filename"] = disposition[b"filename"].decode("utf-8", "replace")
+            upload["content_type"] = state["headers"].get(b"content-type", b"").decode("latin-1")
+            state["is_file"] = True
+        else:
+            state["is_file"] = False
+            state["value"] = bytearray()
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if state["is_file"]:
+            size = upload["size"]
+            new_size = size + (end - start)
+            if new_size > max_file_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_file_bytes} bytes")
+            buffer = upload["buffer"]
+            if new_size > len(buffer):
+                buffer.extend(bytes(max(new_size, min(2 * len(buffer), max_file_bytes)) - len(buffer)))
+            buffer[size:new_size] = memoryview(data)[start:end]
+            upload["size"] = new_size
+        else:
+            value = state["value"]
+            if len(value) + (end - start) > MAX_FIELD_BYTES:
+                raise ValueError(f"Form field '{state['name']}' is too long")
+            value += memoryview(data)[start:end]
+
+    def on_part_end() -> None:
+        if not state.get("is_file"):
+            fields[state["name"]] = state["value"].decode("utf-8", "replace")
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    async for chunk in request.stream():
+        parser.write(chunk)
+    parser.finalize()
+
+    if "buffer" not in upload:
+        return fields, None
+    return fields, ImageUpload(
+        field_name=file_field,
+        filename=upload["filename"],
+        content_type=upload["content_type"],
+        buffer=upload["buffer"],
+        size=upload["size"],
+    )
+
+
+def probe_image(data: memoryview) -> Tuple[str, int, int]:
+    """
+    Return (content_type, width, height) from a JPEG or PNG header without
+    decoding pixels. Raises ValueError for other or truncated formats.
+    """
+    if len(data) >= 24 and data[:8] == _PNG_SIGNATURE and data[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", data[16:24])
+        return PNG_CONTENT_TYPE, width, height
+
+    if len(data) >= 4 and data[0] == 0xFF and data[1] == 0xD8:
+        i = 2
+        n = len(data)
+        while i + 4 <= n:
+            if data[i] != 0xFF:
+                raise ValueError("Corrupt JPEG header")
+            marker = data[i + 1]
+            if marker == 0xFF:
+                # Fill byte
+                i += 1
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+                i += 2
+                continue
+            (length,) = struct.unpack(">H", data[i + 2:i + 4])
+            if marker in _JPEG_SOF_MARKERS:
+                if i + 9 > n:
+                    break
+                height, width = struct.unpack(">HH", data[i + 5:i + 9])
+                return JPEG_CONTENT_TYPE, width, height
+            i += 2 + length
+        raise ValueError("JPEG has no frame header")
+
+    raise ValueError("Unsupported image format; expected JPEG or PNG")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+SmartCity Dash - Direct Postgres Backend Smoke Test
+Exercises every STORAGE_BACKEND=asyncpg query against a real database before
+the backend is switched over: insert, radius, batch points, route, vector
+tile and driver history. Needs DATABASE_URL (the Supabase "Connection
+string", or any Postgres with supabase_setup.sql applied) and an existing
+driver; the hazard it inserts is deleted again at the end.
+Usage: python smoke_pg_backend.py [driver_id]
+"""
+
+import asyncio
+import sys
+from typing import List, Tuple
+
+# A spot in the Gulf of Guinea, so the probe hazard can't mix with real ones
+PROBE_LAT = 0.0123
+PROBE_LON = 0.0456
+
+
+def print_header(text):
+    print(f"\n{'='*60}\n  {text}\n{'='*60}\n")
+
+
+def encode_polyline(points: List[Tuple[float, float]]) -> str:
+    """Google encoded polyline, precision 5."""
+    out = []
+    prev_lat = prev_lon = 0
+    for lat, lon in points:
+        for value, prev in ((round(lat * 1e5), prev_lat), (round(lon * 1e5), prev_lon)):
+            delta = value - prev
+            delta = ~(delta << 1) if delta < 0 else delta << 1
+            while delta >= 0x20:
+                out.append(chr((0x20 | (delta & 0x1F)) + 63))
+                delta >>= 5
+            out.append(chr(delta + 63))
+        prev_lat, prev_lon = round(lat * 1e5), round(lon * 1e5)
+    return "".join(out)
+
+
+async def run(driver_id: str = "") -> bool:
+    from app.config import settings
+    from app.geo import tile_fraction
+    from app.pg_backend import postgres_backend
+
+    await postgres_backend.connect()
+    pool = postgres_backend.pool
+    hazard_id = None
+    results = {}
+    try:
+        if not driver_id:
+            driver_id = str(await pool.fetchval("SELECT id FROM drivers LIMIT 1") or "")
+        if not driver_id:
+            print("   ❌ FAIL: no driver to report as; pass a driver_id\n")
+            return False
+        print(f"   Driver: {driver_id}\n")
+
+        row = await postgres_backend.insert_hazard(
+            driver_id, PROBE_LAT, PROBE_LON, "pothole", "low", 0.5,
+        )
+        hazard_id = row["id"] if row else None
+        results["insert"] = hazard_id is not None
+
+        rows = await postgres_backend.hazards_within_radius(PROBE_LAT, PROBE_LON, 0.1)
+        results["radius"] = any(r["id"] == hazard_id for r in rows)
+
+        rows = await postgres_backend.hazards_near_points(
+            [(PROBE_LAT + 1.0, PROBE_LON, 0.1), (PROBE_LAT, PROBE_LON, 0.1)],
+        )
+        results["points"] = any(r["id"] == hazard_id and r["point_index"] == 1 for r in rows)
+
+        polyline = encode_polyline([(PROBE_LAT, PROBE_LON - 0.01), (PROBE_LAT, PROBE_LON + 0.01)])
+        rows = await postgres_backend.hazards_along_route(polyline, 50.0)
+        results["route"] = any(r["id"] == hazard_id for r in rows)
+
+        z = 16
+        fx, fy = tile_fraction(PROBE_LAT, PROBE_LON, z)
+        tile = await postgres_backend.hazard_tile(
+            z, int(fx), int(fy), settings.tile_cluster_below_zoom, settings.tile_cluster_cells,
+        )
+        results["tile"] = len(tile) > 0
+
+        rows, total = await postgres_backend.driver_history(driver_id, limit=10)
+        results["history"] = any(r["id"] == hazard_id for r in rows) and bool(total)
+    finally:
+        if hazard_id is not None:
+            await pool.execute("DELETE FROM hazards WHERE id = $1::uuid", hazard_id)
+        await postgres_backend.close()
+
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return len(results) == 6 and all(results.values())
+
+
+def main():
+    print_header("SmartCity Dash - asyncpg Backend Smoke Test")
+    try:
+        ok = asyncio.run(run(sys.argv[1] if len(sys.argv) > 1 else ""))
+    except Exception as e:
+        print(f"   ❌ ERROR: {e}\n")
+        return 1
+    if ok:
+        print("\n   🎉 All queries answered. STORAGE_BACKEND=asyncpg is safe to try.\n")
+        return 0
+    print("\n   ⚠️  Keep STORAGE_BACKEND=postgrest until the failures above are fixed.\n")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
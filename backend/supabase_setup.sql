@@ -2,7 +2,9 @@
 -- SmartCity Dash: Supabase Database Schema with PostGIS
 -- =============================================================================
 -- Run this entire script in Supabase SQL Editor
--- It will set up everything needed for geospatial hazard tracking
+-- It will set up everything needed for geospatial hazard tracking.
+-- Every statement is re-runnable, so running it again on an existing install
+-- applies the "existing installs" migrations below instead of aborting
 
 
 -- 1. ENABLE POSTGIS EXTENSION
@@ -18,24 +20,40 @@ SELECT postgis_version();
 -- =============================================================================
 CREATE TABLE IF NOT EXISTS drivers (
     id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
-    email TEXT NOT NULL UNIQUE,
+    email TEXT UNIQUE,  -- NULL for phone-auth users
     full_name TEXT,
     vehicle_type TEXT,
     license_plate TEXT,
     phone TEXT,
+    auto_reporting BOOLEAN NOT NULL DEFAULT TRUE,
+    high_resolution BOOLEAN NOT NULL DEFAULT TRUE,
+    sound_alerts BOOLEAN NOT NULL DEFAULT TRUE,
+    cloud_backup BOOLEAN NOT NULL DEFAULT FALSE,
+    anonymous_mode BOOLEAN NOT NULL DEFAULT FALSE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     is_active BOOLEAN DEFAULT TRUE
 );
 
+-- Existing installs: phone-auth users have no email, and the settings
+-- columns were added after the table was first created
+ALTER TABLE drivers ALTER COLUMN email DROP NOT NULL;
+ALTER TABLE drivers ADD COLUMN IF NOT EXISTS auto_reporting BOOLEAN NOT NULL DEFAULT TRUE;
+ALTER TABLE drivers ADD COLUMN IF NOT EXISTS high_resolution BOOLEAN NOT NULL DEFAULT TRUE;
+ALTER TABLE drivers ADD COLUMN IF NOT EXISTS sound_alerts BOOLEAN NOT NULL DEFAULT TRUE;
+ALTER TABLE drivers ADD COLUMN IF NOT EXISTS cloud_backup BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE drivers ADD COLUMN IF NOT EXISTS anonymous_mode BOOLEAN NOT NULL DEFAULT FALSE;
+
 -- Enable RLS (Row Level Security) for drivers
 ALTER TABLE drivers ENABLE ROW LEVEL SECURITY;
 
 -- Policy: Users can only read their own driver record
+DROP POLICY IF EXISTS "drivers_select_own" ON drivers;
 CREATE POLICY "drivers_select_own" ON drivers
     FOR SELECT USING (auth.uid() = id);
 
 -- Policy: Users can update only their own record
+DROP POLICY IF EXISTS "drivers_update_own" ON drivers;
 CREATE POLICY "drivers_update_own" ON drivers
     FOR UPDATE USING (auth.uid() = id);
 
@@ -53,48 +71,81 @@ CREATE TABLE IF NOT EXISTS hazards (
     longitude DECIMAL(11, 8) NOT NULL,
     description TEXT,
     photo_url TEXT,
+    report_count INT NOT NULL DEFAULT 1,
+    last_reported_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    -- Set by expire_hazards once the hazard outlives its type's lifetime
+    expired BOOLEAN NOT NULL DEFAULT FALSE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Existing installs: columns added after the table was first created.
+-- last_reported_at starts at created_at so old hazards don't look re-reported
+ALTER TABLE hazards ADD COLUMN IF NOT EXISTS report_count INT NOT NULL DEFAULT 1;
+ALTER TABLE hazards ADD COLUMN IF NOT EXISTS last_reported_at TIMESTAMP WITH TIME ZONE;
+UPDATE hazards SET last_reported_at = created_at WHERE last_reported_at IS NULL;
+ALTER TABLE hazards ALTER COLUMN last_reported_at SET DEFAULT NOW();
+ALTER TABLE hazards ADD COLUMN IF NOT EXISTS expired BOOLEAN NOT NULL DEFAULT FALSE;
+
 -- Enable RLS for hazards
 ALTER TABLE hazards ENABLE ROW LEVEL SECURITY;
 
 -- Policy: Anyone can read hazards
+DROP POLICY IF EXISTS "hazards_select_all" ON hazards;
 CREATE POLICY "hazards_select_all" ON hazards
     FOR SELECT USING (TRUE);
 
 -- Policy: Drivers can insert their own hazards
+DROP POLICY IF EXISTS "hazards_insert_own" ON hazards;
 CREATE POLICY "hazards_insert_own" ON hazards
     FOR INSERT WITH CHECK (auth.uid() = driver_id);
 
 -- 4. CREATE GEOSPATIAL INDEXES
 -- =============================================================================
--- GIST index for fast spatial queries on location column
-CREATE INDEX idx_hazards_location_gist ON hazards USING GIST(location);
+-- GIST index for fast spatial queries on location column. Partial on live
+-- hazards, so its size tracks the active set rather than all history.
+-- Existing installs have it over every row; rebuild that one as partial
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE schemaname = 'public' AND indexname = 'idx_hazards_location_gist'
+          AND indexdef NOT LIKE '%WHERE%'
+    ) THEN
+        DROP INDEX public.idx_hazards_location_gist;
+    END IF;
+END $$;
+CREATE INDEX IF NOT EXISTS idx_hazards_location_gist ON hazards USING GIST(location) WHERE NOT expired;
 
--- Index on driver_id for fast lookups
-CREATE INDEX idx_hazards_driver_id ON hazards(driver_id);
+-- Composite index for driver lookups and keyset-paginated history
+-- (ORDER BY created_at DESC, id DESC); also serves plain driver_id filters,
+-- so the old single-column index is redundant
+CREATE INDEX IF NOT EXISTS idx_hazards_driver_created_id ON hazards(driver_id, created_at DESC, id DESC);
+DROP INDEX IF EXISTS idx_hazards_driver_id;
 
 -- Index on severity_level for filtering
-CREATE INDEX idx_hazards_severity ON hazards(severity_level);
+CREATE INDEX IF NOT EXISTS idx_hazards_severity ON hazards(severity_level);
 
 -- Index on hazard_type for filtering
-CREATE INDEX idx_hazards_type ON hazards(hazard_type);
+CREATE INDEX IF NOT EXISTS idx_hazards_type ON hazards(hazard_type);
 
 -- Index on created_at for time-based queries
-CREATE INDEX idx_hazards_created_at ON hazards(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_hazards_created_at ON hazards(created_at DESC);
 
 
 -- 5. CREATE RPC: Insert Hazard Safely
 -- =============================================================================
+-- Drop the pre-photo_url signature so calls don't resolve to an old overload
+DROP FUNCTION IF EXISTS insert_hazard(UUID, DECIMAL, DECIMAL, TEXT, TEXT, DECIMAL);
+
 CREATE OR REPLACE FUNCTION insert_hazard(
     p_driver_id UUID,
     p_latitude DECIMAL,
     p_longitude DECIMAL,
     p_hazard_type TEXT,
     p_severity_level TEXT,
-    p_confidence_score DECIMAL
+    p_confidence_score DECIMAL,
+    p_photo_url TEXT DEFAULT NULL
 )
 RETURNS TABLE (
     id UUID,
@@ -115,7 +166,8 @@ BEGIN
         confidence_score,
         location,
         latitude,
-        longitude
+        longitude,
+        photo_url
     )
     VALUES (
         p_driver_id,
@@ -124,7 +176,8 @@ BEGIN
         p_confidence_score,
         ST_MakeGeography(ST_MakePoint(p_longitude, p_latitude)::geometry),
         p_latitude,
-        p_longitude
+        p_longitude,
+        p_photo_url
     )
     RETURNING
         hazards.id,
@@ -142,12 +195,364 @@ $$ LANGUAGE plpgsql SECURITY DEFINER;
 GRANT EXECUTE ON FUNCTION insert_hazard TO authenticated;
 
 
+-- 5b. CREATE RPC: Insert Hazards in Bulk
+-- =============================================================================
+-- Multi-row variant of insert_hazard for batch ingestion. p_hazards is a JSON
+-- array of objects with driver_id, latitude, longitude, hazard_type,
+-- severity_level and confidence_score, plus optional id and created_at (used
+-- by the write-behind queue, which hands out ids before the row is written).
+-- created_at is clamped to the last 5 minutes so a caller can't backdate or
+-- post-date a report past the lifetime and delta-sync windows, and
+-- last_reported_at starts from it. Every row is written in one statement;
+-- item_index maps each returned row back to its position in the input array.
+CREATE OR REPLACE FUNCTION insert_hazards(
+    p_hazards JSONB
+)
+RETURNS TABLE (
+    item_index INT,
+    id UUID,
+    driver_id UUID,
+    hazard_type TEXT,
+    severity_level TEXT,
+    confidence_score DECIMAL,
+    latitude DECIMAL,
+    longitude DECIMAL,
+    created_at TIMESTAMP WITH TIME ZONE
+) AS $$
+BEGIN
+    RETURN QUERY
+    WITH input AS (
+        SELECT
+            COALESCE((e.item->>'id')::UUID, gen_random_uuid()) AS new_id,
+            (e.ord - 1)::INT AS ord,
+            LEAST(GREATEST(
+                COALESCE((e.item->>'created_at')::TIMESTAMPTZ, NOW()),
+                NOW() - INTERVAL '5 minutes'
+            ), NOW()) AS created_at,
+            (e.item->>'driver_id')::UUID AS driver_id,
+            e.item->>'hazard_type' AS hazard_type,
+            e.item->>'severity_level' AS severity_level,
+            (e.item->>'confidence_score')::DECIMAL AS confidence_score,
+            (e.item->>'latitude')::DECIMAL AS latitude,
+            (e.item->>'longitude')::DECIMAL AS longitude
+        FROM jsonb_array_elements(p_hazards) WITH ORDINALITY AS e(item, ord)
+    ),
+    inserted AS (
+        INSERT INTO hazards (
+            id,
+            driver_id,
+            hazard_type,
+            severity_level,
+            confidence_score,
+            location,
+            latitude,
+            longitude,
+            created_at,
+            last_reported_at
+        )
+        SELECT
+            i.new_id,
+            i.driver_id,
+            i.hazard_type,
+            i.severity_level,
+            i.confidence_score,
+            ST_MakeGeography(ST_MakePoint(i.longitude, i.latitude)::geometry),
+            i.latitude,
+            i.longitude,
+            i.created_at,
+            i.created_at
+        FROM input i
+        RETURNING
+            hazards.id,
+            hazards.driver_id,
+            hazards.hazard_type,
+            hazards.severity_level,
+            hazards.confidence_score,
+            hazards.latitude,
+            hazards.longitude,
+            hazards.created_at
+    )
+    SELECT
+        i.ord,
+        ins.id,
+        ins.driver_id,
+        ins.hazard_type,
+        ins.severity_level,
+        ins.confidence_score,
+        ins.latitude,
+        ins.longitude,
+        ins.created_at
+    FROM inserted ins
+    JOIN input i ON i.new_id = ins.id
+    ORDER BY i.ord;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION insert_hazards(JSONB) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION insert_hazards(JSONB) TO authenticated, service_role;
+
+
+-- 5c. CREATE RPC: Merge a Repeat Report into an Existing Hazard
+-- =============================================================================
+-- Folds one new sighting into a canonical hazard: bumps report_count,
+-- averages confidence_score weighted by report count, keeps the higher
+-- severity and refreshes last_reported_at. Returns no row if the hazard no
+-- longer exists. Not callable with the anon key: the dedup RPCs call it as
+-- their owner, and the backend's direct merge needs the service_role key.
+DROP FUNCTION IF EXISTS insert_hazard_dedup(UUID, DECIMAL, DECIMAL, TEXT, TEXT, DECIMAL, DECIMAL, INT);
+DROP FUNCTION IF EXISTS merge_hazard_report(UUID, TEXT, DECIMAL, INT);
+
+CREATE OR REPLACE FUNCTION merge_hazard_report(
+    p_hazard_id UUID,
+    p_severity_level TEXT,
+    p_confidence_score DECIMAL
+)
+RETURNS TABLE (
+    id UUID,
+    driver_id UUID,
+    hazard_type TEXT,
+    severity_level TEXT,
+    confidence_score DECIMAL,
+    latitude DECIMAL,
+    longitude DECIMAL,
+    created_at TIMESTAMP WITH TIME ZONE,
+    report_count INT,
+    last_reported_at TIMESTAMP WITH TIME ZONE
+) AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE hazards h
+    SET
+        confidence_score = ROUND(
+            (h.confidence_score * h.report_count + p_confidence_score)
+            / (h.report_count + 1),
+            3
+        ),
+        severity_level = CASE
+            WHEN array_position(ARRAY['low', 'medium', 'high', 'critical'], p_severity_level)
+               > array_position(ARRAY['low', 'medium', 'high', 'critical'], h.severity_level)
+            THEN p_severity_level
+            ELSE h.severity_level
+        END,
+        report_count = h.report_count + 1,
+        last_reported_at = NOW(),
+        updated_at = NOW()
+    WHERE h.id = p_hazard_id
+    RETURNING
+        h.id,
+        h.driver_id,
+        h.hazard_type,
+        h.severity_level,
+        h.confidence_score,
+        h.latitude,
+        h.longitude,
+        h.created_at,
+        h.report_count,
+        h.last_reported_at;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION merge_hazard_report(UUID, TEXT, DECIMAL) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION merge_hazard_report(UUID, TEXT, DECIMAL) TO authenticated, service_role;
+
+
+-- 5d. CREATE RPC: Insert Hazard with Spatio-Temporal Deduplication
+-- =============================================================================
+-- If a hazard of the same type was reported within p_radius_m metres in the
+-- last p_window_minutes, the report is merged into it (merged = TRUE);
+-- otherwise a new hazard is inserted.
+CREATE OR REPLACE FUNCTION insert_hazard_dedup(
+    p_driver_id UUID,
+    p_latitude DECIMAL,
+    p_longitude DECIMAL,
+    p_hazard_type TEXT,
+    p_severity_level TEXT,
+    p_confidence_score DECIMAL,
+    p_radius_m DECIMAL DEFAULT 25,
+    p_window_minutes INT DEFAULT 30
+)
+RETURNS TABLE (
+    id UUID,
+    driver_id UUID,
+    hazard_type TEXT,
+    severity_level TEXT,
+    confidence_score DECIMAL,
+    latitude DECIMAL,
+    longitude DECIMAL,
+    created_at TIMESTAMP WITH TIME ZONE,
+    report_count INT,
+    last_reported_at TIMESTAMP WITH TIME ZONE,
+    merged BOOLEAN
+) AS $$
+DECLARE
+    v_point GEOGRAPHY := ST_MakeGeography(ST_MakePoint(p_longitude, p_latitude)::geometry);
+    v_existing UUID;
+BEGIN
+    SELECT h.id INTO v_existing
+    FROM hazards h
+    WHERE h.hazard_type = p_hazard_type
+      AND NOT h.expired
+      AND h.last_reported_at >= NOW() - make_interval(mins => p_window_minutes)
+      AND ST_DWithin(h.location, v_point, p_radius_m)
+    ORDER BY h.location <-> v_point
+    LIMIT 1
+    FOR UPDATE;
+
+    IF v_existing IS NOT NULL THEN
+        RETURN QUERY
+        SELECT m.*, TRUE
+        FROM merge_hazard_report(v_existing, p_severity_level, p_confidence_score) m;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT ins.*, 1, ins.created_at, FALSE
+    FROM insert_hazard(
+        p_driver_id, p_latitude, p_longitude,
+        p_hazard_type, p_severity_level, p_confidence_score
+    ) ins;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+GRANT EXECUTE ON FUNCTION insert_hazard_dedup TO authenticated;
+
+
+-- 5e. CREATE RPC: Insert Hazards in Bulk with Deduplication
+-- =============================================================================
+-- insert_hazard_dedup for a batch, in one call and one transaction (used by
+-- the write-behind queue when dedup is on). p_hazards is shaped as for
+-- insert_hazards. Items are handled in array order, so a repeat sighting
+-- later in the same batch merges into the hazard an earlier item created.
+-- A merged item returns the canonical hazard, not its own pre-assigned id.
+-- created_at is clamped as in insert_hazards.
+CREATE OR REPLACE FUNCTION insert_hazards_dedup(
+    p_hazards JSONB,
+    p_radius_m DECIMAL DEFAULT 25,
+    p_window_minutes INT DEFAULT 30
+)
+RETURNS TABLE (
+    item_index INT,
+    id UUID,
+    driver_id UUID,
+    hazard_type TEXT,
+    severity_level TEXT,
+    confidence_score DECIMAL,
+    latitude DECIMAL,
+    longitude DECIMAL,
+    created_at TIMESTAMP WITH TIME ZONE,
+    report_count INT,
+    last_reported_at TIMESTAMP WITH TIME ZONE,
+    merged BOOLEAN
+) AS $$
+DECLARE
+    v_item JSONB;
+    v_ord BIGINT;
+    v_point GEOGRAPHY;
+    v_existing UUID;
+    v_created_at TIMESTAMP WITH TIME ZONE;
+BEGIN
+    FOR v_item, v_ord IN
+        SELECT e.item, e.ord FROM jsonb_array_elements(p_hazards) WITH ORDINALITY AS e(item, ord)
+    LOOP
+        v_point := ST_MakeGeography(ST_MakePoint(
+            (v_item->>'longitude')::DECIMAL, (v_item->>'latitude')::DECIMAL
+        )::geometry);
+        v_created_at := LEAST(GREATEST(
+            COALESCE((v_item->>'created_at')::TIMESTAMPTZ, NOW()),
+            NOW() - INTERVAL '5 minutes'
+        ), NOW());
+
+        SELECT h.id INTO v_existing
+        FROM hazards h
+        WHERE h.hazard_type = v_item->>'hazard_type'
+          AND NOT h.expired
+          AND h.last_reported_at >= NOW() - make_interval(mins => p_window_minutes)
+          AND ST_DWithin(h.location, v_point, p_radius_m)
+        ORDER BY h.location <-> v_point
+        LIMIT 1
+        FOR UPDATE;
+
+        IF v_existing IS NOT NULL THEN
+            RETURN QUERY
+            SELECT (v_ord - 1)::INT, m.*, TRUE
+            FROM merge_hazard_report(
+                v_existing, v_item->>'severity_level', (v_item->>'confidence_score')::DECIMAL
+            ) m;
+            CONTINUE;
+        END IF;
+
+        RETURN QUERY
+        INSERT INTO hazards AS h (
+            id,
+            driver_id,
+            hazard_type,
+            severity_level,
+            confidence_score,
+            location,
+            latitude,
+            longitude,
+            created_at,
+            last_reported_at
+        )
+        VALUES (
+            COALESCE((v_item->>'id')::UUID, gen_random_uuid()),
+            (v_item->>'driver_id')::UUID,
+            v_item->>'hazard_type',
+            v_item->>'severity_level',
+            (v_item->>'confidence_score')::DECIMAL,
+            v_point,
+            (v_item->>'latitude')::DECIMAL,
+            (v_item->>'longitude')::DECIMAL,
+            v_created_at,
+            v_created_at
+        )
+        RETURNING
+            (v_ord - 1)::INT,
+            h.id,
+            h.driver_id,
+            h.hazard_type,
+            h.severity_level,
+            h.confidence_score,
+            h.latitude,
+            h.longitude,
+            h.created_at,
+            h.report_count,
+            h.last_reported_at,
+            FALSE;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION insert_hazards_dedup(JSONB, DECIMAL, INT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION insert_hazards_dedup(JSONB, DECIMAL, INT) TO authenticated, service_role;
+
+
 -- 6. CREATE RPC: Fetch Hazards Within Radius
 -- =============================================================================
+-- Only live hazards are returned. p_lifetimes maps hazard_type to a lifetime
+-- in seconds, counted from the last report; hazards past it are skipped even
+-- before expire_hazards has flagged them. Types not in p_lifetimes (or a NULL
+-- p_lifetimes) never expire by age. p_created_after, when given, bounds
+-- created_at so that a partitioned hazards table (section 7c) only scans
+-- the recent partitions.
+-- p_hazard_types / p_severity_levels restrict the result to those values,
+-- and p_max_results keeps only the nearest hazards: candidates come off the
+-- GIST index in KNN (<->) order, so the exact distance is only computed for
+-- the rows actually returned.
+-- Signature and return columns changed over time; drop the old versions
+DROP FUNCTION IF EXISTS get_hazards_within_radius(DECIMAL, DECIMAL, DECIMAL);
+DROP FUNCTION IF EXISTS get_hazards_within_radius(DECIMAL, DECIMAL, DECIMAL, JSONB);
+DROP FUNCTION IF EXISTS get_hazards_within_radius(DECIMAL, DECIMAL, DECIMAL, JSONB, TIMESTAMP WITH TIME ZONE);
+
 CREATE OR REPLACE FUNCTION get_hazards_within_radius(
     p_latitude DECIMAL,
     p_longitude DECIMAL,
-    p_radius_km DECIMAL DEFAULT 2.0
+    p_radius_km DECIMAL DEFAULT 2.0,
+    p_lifetimes JSONB DEFAULT NULL,
+    p_created_after TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_hazard_types TEXT[] DEFAULT NULL,
+    p_severity_levels TEXT[] DEFAULT NULL,
+    p_max_results INT DEFAULT NULL
 )
 RETURNS TABLE (
     id UUID,
@@ -158,8 +563,98 @@ RETURNS TABLE (
     latitude DECIMAL,
     longitude DECIMAL,
     created_at TIMESTAMP WITH TIME ZONE,
+    report_count INT,
+    last_reported_at TIMESTAMP WITH TIME ZONE,
     distance_meters INT
 ) AS $$
+DECLARE
+    v_point GEOGRAPHY := ST_MakeGeography(ST_MakePoint(p_longitude, p_latitude)::geometry);
+BEGIN
+    RETURN QUERY
+    SELECT
+        n.id,
+        n.driver_id,
+        n.hazard_type,
+        n.severity_level,
+        n.confidence_score,
+        n.latitude,
+        n.longitude,
+        n.created_at,
+        n.report_count,
+        n.last_reported_at,
+        CAST(ST_Distance(n.location, v_point) AS INT) AS distance_meters
+    FROM (
+        SELECT
+            h.id,
+            h.driver_id,
+            h.hazard_type,
+            h.severity_level,
+            h.confidence_score,
+            h.latitude,
+            h.longitude,
+            h.created_at,
+            h.report_count,
+            h.last_reported_at,
+            h.location
+        FROM hazards h
+        WHERE ST_DWithin(h.location, v_point, p_radius_km * 1000)  -- km to meters
+          AND NOT h.expired
+          AND h.created_at >= COALESCE(p_created_after, '-infinity'::TIMESTAMPTZ)
+          AND (p_hazard_types IS NULL OR h.hazard_type = ANY(p_hazard_types))
+          AND (p_severity_levels IS NULL OR h.severity_level = ANY(p_severity_levels))
+          AND (
+              p_lifetimes IS NULL
+              OR NOT (p_lifetimes ? h.hazard_type)
+              OR COALESCE(h.last_reported_at, h.created_at)
+                 >= NOW() - make_interval(secs => (p_lifetimes->>h.hazard_type)::DOUBLE PRECISION)
+          )
+        ORDER BY h.location <-> v_point
+        LIMIT p_max_results  -- NULL means no limit
+    ) n
+    ORDER BY distance_meters ASC;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Grant execute permission to all users (for nearby hazards endpoint)
+GRANT EXECUTE ON FUNCTION get_hazards_within_radius TO anon, authenticated;
+
+
+-- 6a. CREATE RPC: Fetch Hazards Along a Route
+-- =============================================================================
+-- Live hazards within p_corridor_m metres of the route given as an encoded
+-- polyline (Google algorithm, precision 5), in order along the route. This
+-- is a single ST_DWithin against the route linestring, served by the
+-- partial GIST index. distance_along_meters is the hazard's closest point
+-- on the route as a fraction of the line (planar) times its geodesic
+-- length. Filters, expiry and p_max_results behave as in
+-- get_hazards_within_radius.
+CREATE OR REPLACE FUNCTION get_hazards_along_route(
+    p_polyline TEXT,
+    p_corridor_m DECIMAL DEFAULT 50,
+    p_lifetimes JSONB DEFAULT NULL,
+    p_created_after TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_hazard_types TEXT[] DEFAULT NULL,
+    p_severity_levels TEXT[] DEFAULT NULL,
+    p_max_results INT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    driver_id UUID,
+    hazard_type TEXT,
+    severity_level TEXT,
+    confidence_score DECIMAL,
+    latitude DECIMAL,
+    longitude DECIMAL,
+    created_at TIMESTAMP WITH TIME ZONE,
+    report_count INT,
+    last_reported_at TIMESTAMP WITH TIME ZONE,
+    distance_along_meters INT,
+    distance_from_route_meters INT
+) AS $$
+DECLARE
+    v_route GEOMETRY := ST_SetSRID(ST_LineFromEncodedPolyline(p_polyline, 5), 4326);
+    v_route_geog GEOGRAPHY := v_route::geography;
+    v_length DOUBLE PRECISION := ST_Length(v_route_geog);
 BEGIN
     RETURN QUERY
     SELECT
@@ -171,24 +666,400 @@ BEGIN
         h.latitude,
         h.longitude,
         h.created_at,
-        CAST(
-            ST_Distance(
-                h.location,
-                ST_MakeGeography(ST_MakePoint(p_longitude, p_latitude)::geometry)
-            ) AS INT
-        ) AS distance_meters
+        h.report_count,
+        h.last_reported_at,
+        CAST(ST_LineLocatePoint(v_route, h.location::geometry) * v_length AS INT) AS distance_along_meters,
+        CAST(ST_Distance(h.location, v_route_geog) AS INT) AS distance_from_route_meters
     FROM hazards h
-    WHERE ST_DWithin(
-        h.location,
-        ST_MakeGeography(ST_MakePoint(p_longitude, p_latitude)::geometry),
-        p_radius_km * 1000  -- Convert km to meters
-    )
-    ORDER BY distance_meters ASC;
+    WHERE ST_DWithin(h.location, v_route_geog, p_corridor_m)
+      AND NOT h.expired
+      AND h.created_at >= COALESCE(p_created_after, '-infinity'::TIMESTAMPTZ)
+      AND (p_hazard_types IS NULL OR h.hazard_type = ANY(p_hazard_types))
+      AND (p_severity_levels IS NULL OR h.severity_level = ANY(p_severity_levels))
+      AND (
+          p_lifetimes IS NULL
+          OR NOT (p_lifetimes ? h.hazard_type)
+          OR COALESCE(h.last_reported_at, h.created_at)
+             >= NOW() - make_interval(secs => (p_lifetimes->>h.hazard_type)::DOUBLE PRECISION)
+      )
+    ORDER BY 11  -- distance_along_meters; by position, as the name is also an OUT parameter
+    LIMIT p_max_results;  -- NULL means no limit
 END;
 $$ LANGUAGE plpgsql;
 
--- Grant execute permission to all users (for nearby hazards endpoint)
-GRANT EXECUTE ON FUNCTION get_hazards_within_radius TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_hazards_along_route TO anon, authenticated;
+
+
+-- 6b. CREATE RPC: Upsert Driver Settings
+-- =============================================================================
+-- Patches only the keys present in p_settings (full_name, vehicle_type,
+-- auto_reporting, high_resolution, sound_alerts, cloud_backup,
+-- anonymous_mode) in a single statement. A driver without a drivers row yet
+-- gets one created from their auth.users record; returns no row if there is
+-- no such user. Callers may only patch their own row, except service_role.
+CREATE OR REPLACE FUNCTION upsert_driver_settings(
+    p_driver_id UUID,
+    p_settings JSONB
+)
+RETURNS SETOF drivers AS $$
+BEGIN
+    IF auth.uid() IS DISTINCT FROM p_driver_id
+        AND COALESCE(auth.jwt() ->> 'role', '') <> 'service_role' THEN
+        RAISE EXCEPTION 'not allowed to change settings of driver %', p_driver_id
+            USING ERRCODE = '42501';
+    END IF;
+
+    RETURN QUERY
+    INSERT INTO drivers AS d (
+        id,
+        email,
+        phone,
+        full_name,
+        vehicle_type,
+        auto_reporting,
+        high_resolution,
+        sound_alerts,
+        cloud_backup,
+        anonymous_mode,
+        updated_at
+    )
+    SELECT
+        u.id,
+        u.email,
+        u.phone,
+        p_settings->>'full_name',
+        p_settings->>'vehicle_type',
+        COALESCE((p_settings->>'auto_reporting')::BOOLEAN, TRUE),
+        COALESCE((p_settings->>'high_resolution')::BOOLEAN, TRUE),
+        COALESCE((p_settings->>'sound_alerts')::BOOLEAN, TRUE),
+        COALESCE((p_settings->>'cloud_backup')::BOOLEAN, FALSE),
+        COALESCE((p_settings->>'anonymous_mode')::BOOLEAN, FALSE),
+        NOW()
+    FROM auth.users u
+    WHERE u.id = p_driver_id
+    ON CONFLICT (id) DO UPDATE SET
+        full_name = CASE WHEN p_settings ? 'full_name'
+            THEN EXCLUDED.full_name ELSE d.full_name END,
+        vehicle_type = CASE WHEN p_settings ? 'vehicle_type'
+            THEN EXCLUDED.vehicle_type ELSE d.vehicle_type END,
+        auto_reporting = CASE WHEN p_settings ? 'auto_reporting'
+            THEN EXCLUDED.auto_reporting ELSE d.auto_reporting END,
+        high_resolution = CASE WHEN p_settings ? 'high_resolution'
+            THEN EXCLUDED.high_resolution ELSE d.high_resolution END,
+        sound_alerts = CASE WHEN p_settings ? 'sound_alerts'
+            THEN EXCLUDED.sound_alerts ELSE d.sound_alerts END,
+        cloud_backup = CASE WHEN p_settings ? 'cloud_backup'
+            THEN EXCLUDED.cloud_backup ELSE d.cloud_backup END,
+        anonymous_mode = CASE WHEN p_settings ? 'anonymous_mode'
+            THEN EXCLUDED.anonymous_mode ELSE d.anonymous_mode END,
+        updated_at = NOW()
+    RETURNING d.*;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION upsert_driver_settings(UUID, JSONB) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION upsert_driver_settings(UUID, JSONB) TO authenticated, service_role;
+
+
+-- 6c. CREATE RPC: Expire Hazards Past Their Lifetime
+-- =============================================================================
+-- Lifetime per hazard_type, in seconds, counted from the last report.
+-- expire_hazards reads it from here rather than trusting its caller; keep it
+-- in step with the API's HAZARD_LIFETIMES_HOURS. Types without a row never
+-- expire. RLS with no policies: only the owner and service_role can touch it.
+CREATE TABLE IF NOT EXISTS hazard_lifetimes (
+    hazard_type TEXT PRIMARY KEY,
+    lifetime_seconds DOUBLE PRECISION NOT NULL CHECK (lifetime_seconds > 0)
+);
+
+INSERT INTO hazard_lifetimes (hazard_type, lifetime_seconds) VALUES
+    ('traffic_congestion', 3600),
+    ('accident', 21600),
+    ('road_debris', 86400),
+    ('waterlogging', 172800),
+    ('broken_streetlight', 2592000),
+    ('pothole', 7776000)
+ON CONFLICT (hazard_type) DO NOTHING;
+
+ALTER TABLE hazard_lifetimes ENABLE ROW LEVEL SECURITY;
+
+-- Flags up to p_batch_size live hazards whose lifetime has elapsed, which
+-- drops them from the partial GIST index. Rows are kept for driver history
+-- and statistics. Returns the number flagged; call again until it returns
+-- less than p_batch_size. Not callable by API clients: run it as
+-- service_role or from pg_cron (scheduled below when available).
+-- The caller-supplied p_lifetimes version is dropped
+DROP FUNCTION IF EXISTS expire_hazards(JSONB, INT);
+
+CREATE OR REPLACE FUNCTION expire_hazards(
+    p_batch_size INT DEFAULT 5000
+)
+RETURNS INT AS $$
+DECLARE
+    v_count INT;
+BEGIN
+    UPDATE hazards h
+    SET expired = TRUE, updated_at = NOW()
+    WHERE h.id IN (
+        SELECT e.id
+        FROM hazards e
+        JOIN hazard_lifetimes l ON l.hazard_type = e.hazard_type
+        WHERE NOT e.expired
+          AND COALESCE(e.last_reported_at, e.created_at)
+              < NOW() - make_interval(secs => l.lifetime_seconds)
+        LIMIT LEAST(GREATEST(p_batch_size, 1), 50000)
+        FOR UPDATE OF e SKIP LOCKED
+    );
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION expire_hazards(INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION expire_hazards(INT) TO service_role;
+
+-- Hourly expiry job when pg_cron is enabled, so expiry does not depend on
+-- the API holding a service_role key
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('hazard-expiry', '17 * * * *', 'SELECT expire_hazards(50000)');
+    END IF;
+END;
+$$;
+
+
+-- 6d. CREATE RPC: Hazard Vector Tiles
+-- =============================================================================
+-- get_hazard_tile returns the live hazards in web-mercator tile z/x/y as a
+-- Mapbox Vector Tile (needs PostGIS 3.1+). From p_cluster_below_zoom up,
+-- every hazard is its own point in layer "hazards". Below it, hazards are
+-- snapped to a grid of p_cluster_cells cells per tile side, and each cell
+-- becomes one point in layer "hazard_clusters" carrying point_count, the
+-- most common hazard_type and the worst severity_level.
+-- p_lifetimes / p_created_after behave as in get_hazards_within_radius.
+-- hazards_in_tile is the shared row source. It covers the tile plus its
+-- render buffer and goes through the partial GIST index.
+CREATE OR REPLACE FUNCTION hazards_in_tile(
+    p_z INT,
+    p_x INT,
+    p_y INT,
+    p_margin DOUBLE PRECISION,
+    p_lifetimes JSONB DEFAULT NULL,
+    p_created_after TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    hazard_type TEXT,
+    severity_level TEXT,
+    confidence_score DECIMAL,
+    report_count INT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    geom GEOMETRY
+) AS $$
+    SELECT
+        h.id,
+        h.hazard_type,
+        h.severity_level,
+        h.confidence_score,
+        COALESCE(h.report_count, 1),
+        h.created_at,
+        ST_Transform(h.location::geometry, 3857)
+    FROM hazards h
+    WHERE (
+            -- Tiles at zoom 0-1 span half the globe or more; scan them whole
+            p_z < 2
+            OR ST_Intersects(
+                h.location,
+                -- Segmentized so the geography edges follow the tile's parallels
+                ST_Segmentize(
+                    ST_Intersection(
+                        ST_Transform(ST_TileEnvelope(p_z, p_x, p_y, margin => p_margin), 4326),
+                        ST_MakeEnvelope(-180, -90, 180, 90, 4326)
+                    ),
+                    1.0
+                )::geography
+            )
+          )
+      AND NOT h.expired
+      AND h.created_at >= COALESCE(p_created_after, '-infinity'::TIMESTAMPTZ)
+      AND (
+          p_lifetimes IS NULL
+          OR NOT (p_lifetimes ? h.hazard_type)
+          OR COALESCE(h.last_reported_at, h.created_at)
+             >= NOW() - make_interval(secs => (p_lifetimes->>h.hazard_type)::DOUBLE PRECISION)
+      );
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION get_hazard_tile(
+    p_z INT,
+    p_x INT,
+    p_y INT,
+    p_cluster_below_zoom INT DEFAULT 13,
+    p_cluster_cells INT DEFAULT 64,
+    p_lifetimes JSONB DEFAULT NULL,
+    p_created_after TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS BYTEA AS $$
+DECLARE
+    v_extent CONSTANT INT := 4096;
+    v_buffer CONSTANT INT := 64;
+    v_bounds GEOMETRY := ST_TileEnvelope(p_z, p_x, p_y);
+    v_cell DOUBLE PRECISION := (ST_XMax(v_bounds) - ST_XMin(v_bounds)) / p_cluster_cells;
+    v_margin DOUBLE PRECISION := v_buffer::DOUBLE PRECISION / v_extent;
+    v_tile BYTEA;
+BEGIN
+    IF p_z >= p_cluster_below_zoom THEN
+        SELECT ST_AsMVT(t, 'hazards', v_extent, 'geom') INTO v_tile
+        FROM (
+            SELECT
+                r.id::TEXT AS id,
+                r.hazard_type,
+                r.severity_level,
+                r.confidence_score::DOUBLE PRECISION AS confidence_score,
+                r.report_count,
+                EXTRACT(EPOCH FROM r.created_at)::BIGINT AS created_at,
+                ST_AsMVTGeom(r.geom, v_bounds, v_extent, v_buffer) AS geom
+            FROM hazards_in_tile(p_z, p_x, p_y, v_margin, p_lifetimes, p_created_after) r
+        ) t
+        WHERE t.geom IS NOT NULL;
+    ELSE
+        SELECT ST_AsMVT(t, 'hazard_clusters', v_extent, 'geom') INTO v_tile
+        FROM (
+            SELECT
+                COUNT(*)::INT AS point_count,
+                SUM(r.report_count)::INT AS report_count,
+                mode() WITHIN GROUP (ORDER BY r.hazard_type) AS hazard_type,
+                (ARRAY['low', 'medium', 'high', 'critical'])[
+                    MAX(array_position(ARRAY['low', 'medium', 'high', 'critical'], r.severity_level))
+                ] AS severity_level,
+                ST_AsMVTGeom(ST_Centroid(ST_Collect(r.geom)), v_bounds, v_extent, v_buffer) AS geom
+            FROM hazards_in_tile(p_z, p_x, p_y, v_margin, p_lifetimes, p_created_after) r
+            GROUP BY floor(ST_X(r.geom) / v_cell), floor(ST_Y(r.geom) / v_cell)
+        ) t
+        WHERE t.geom IS NOT NULL;
+    END IF;
+    RETURN COALESCE(v_tile, ''::BYTEA);
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+GRANT EXECUTE ON FUNCTION hazards_in_tile TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_hazard_tile TO anon, authenticated;
+
+
+-- 6e. CREATE RPC: Fetch Hazards Near Many Points
+-- =============================================================================
+-- Batch form of get_hazards_within_radius for fleet consoles. Point i is
+-- (p_latitudes[i], p_longitudes[i]) with radius p_radii_km[i]. All points
+-- are resolved in one statement: the arrays are unnested and each point
+-- runs a LATERAL KNN search on the partial GIST index. Rows carry the
+-- 0-based point_index. Points with no hazards return no rows.
+-- p_max_results applies per point. count_hazards_near_points returns only
+-- the per-point totals, with no cap.
+CREATE OR REPLACE FUNCTION get_hazards_near_points(
+    p_latitudes DECIMAL[],
+    p_longitudes DECIMAL[],
+    p_radii_km DECIMAL[],
+    p_lifetimes JSONB DEFAULT NULL,
+    p_created_after TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_hazard_types TEXT[] DEFAULT NULL,
+    p_severity_levels TEXT[] DEFAULT NULL,
+    p_max_results INT DEFAULT NULL
+)
+RETURNS TABLE (
+    point_index INT,
+    id UUID,
+    driver_id UUID,
+    hazard_type TEXT,
+    severity_level TEXT,
+    confidence_score DECIMAL,
+    latitude DECIMAL,
+    longitude DECIMAL,
+    created_at TIMESTAMP WITH TIME ZONE,
+    report_count INT,
+    last_reported_at TIMESTAMP WITH TIME ZONE,
+    distance_meters INT
+) AS $$
+    SELECT
+        (p.ord - 1)::INT,
+        n.id,
+        n.driver_id,
+        n.hazard_type,
+        n.severity_level,
+        n.confidence_score,
+        n.latitude,
+        n.longitude,
+        n.created_at,
+        n.report_count,
+        n.last_reported_at,
+        CAST(ST_Distance(n.location, p.point) AS INT)
+    FROM (
+        SELECT
+            u.ord,
+            u.radius_km,
+            ST_SetSRID(ST_MakePoint(u.lon, u.lat), 4326)::geography AS point
+        FROM unnest(p_latitudes, p_longitudes, p_radii_km) WITH ORDINALITY AS u(lat, lon, radius_km, ord)
+    ) p
+    CROSS JOIN LATERAL (
+        SELECT h.*
+        FROM hazards h
+        WHERE ST_DWithin(h.location, p.point, p.radius_km * 1000)
+          AND NOT h.expired
+          AND h.created_at >= COALESCE(p_created_after, '-infinity'::TIMESTAMPTZ)
+          AND (p_hazard_types IS NULL OR h.hazard_type = ANY(p_hazard_types))
+          AND (p_severity_levels IS NULL OR h.severity_level = ANY(p_severity_levels))
+          AND (
+              p_lifetimes IS NULL
+              OR NOT (p_lifetimes ? h.hazard_type)
+              OR COALESCE(h.last_reported_at, h.created_at)
+                 >= NOW() - make_interval(secs => (p_lifetimes->>h.hazard_type)::DOUBLE PRECISION)
+          )
+        ORDER BY h.location <-> p.point
+        LIMIT p_max_results  -- NULL means no limit
+    ) n
+    ORDER BY 1, 12;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION count_hazards_near_points(
+    p_latitudes DECIMAL[],
+    p_longitudes DECIMAL[],
+    p_radii_km DECIMAL[],
+    p_lifetimes JSONB DEFAULT NULL,
+    p_created_after TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_hazard_types TEXT[] DEFAULT NULL,
+    p_severity_levels TEXT[] DEFAULT NULL
+)
+RETURNS TABLE (
+    point_index INT,
+    hazard_count INT
+) AS $$
+    SELECT
+        (u.ord - 1)::INT,
+        (
+            SELECT COUNT(*)::INT
+            FROM hazards h
+            WHERE ST_DWithin(
+                h.location,
+                ST_SetSRID(ST_MakePoint(u.lon, u.lat), 4326)::geography,
+                u.radius_km * 1000
+            )
+              AND NOT h.expired
+              AND h.created_at >= COALESCE(p_created_after, '-infinity'::TIMESTAMPTZ)
+              AND (p_hazard_types IS NULL OR h.hazard_type = ANY(p_hazard_types))
+              AND (p_severity_levels IS NULL OR h.severity_level = ANY(p_severity_levels))
+              AND (
+                  p_lifetimes IS NULL
+                  OR NOT (p_lifetimes ? h.hazard_type)
+                  OR COALESCE(h.last_reported_at, h.created_at)
+                     >= NOW() - make_interval(secs => (p_lifetimes->>h.hazard_type)::DOUBLE PRECISION)
+              )
+        )
+    FROM unnest(p_latitudes, p_longitudes, p_radii_km) WITH ORDINALITY AS u(lat, lon, radius_km, ord)
+    ORDER BY 1;
+$$ LANGUAGE sql STABLE;
+
+GRANT EXECUTE ON FUNCTION get_hazards_near_points TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION count_hazards_near_points TO anon, authenticated;
 
 
 -- 7. CREATE MATERIALIZED VIEW FOR DASHBOARD STATS (Optional but useful)
@@ -205,12 +1076,208 @@ FROM hazards
 GROUP BY report_date, hazard_type, severity_level;
 
 -- Create index on materialized view
-CREATE INDEX idx_hazard_statistics_date ON hazard_statistics(report_date DESC);
+CREATE INDEX IF NOT EXISTS idx_hazard_statistics_date ON hazard_statistics(report_date DESC);
 
 -- Refresh command (run periodically):
 -- REFRESH MATERIALIZED VIEW hazard_statistics;
 
 
+-- 7b. CREATE STORAGE BUCKET FOR HAZARD PHOTOS
+-- =============================================================================
+-- Public-read bucket for dashcam frames uploaded via /api/report-hazard-image
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('hazard-photos', 'hazard-photos', TRUE)
+ON CONFLICT (id) DO NOTHING;
+
+-- The backend stores each photo under <driver_id>/ and uploads it with the
+-- driver's access token when the request carries one, so a driver may only
+-- write (and clean up) their own folder. Uploads made with SUPABASE_KEY
+-- need the service_role key, which bypasses these policies; the anon key
+-- is refused.
+DROP POLICY IF EXISTS "hazard_photos_insert" ON storage.objects;
+CREATE POLICY "hazard_photos_insert" ON storage.objects
+    FOR INSERT TO authenticated WITH CHECK (
+        bucket_id = 'hazard-photos' AND (storage.foldername(name))[1] = auth.uid()::TEXT
+    );
+
+-- Removing an object needs it to be visible as well as deletable
+DROP POLICY IF EXISTS "hazard_photos_select_own" ON storage.objects;
+CREATE POLICY "hazard_photos_select_own" ON storage.objects
+    FOR SELECT TO authenticated USING (
+        bucket_id = 'hazard-photos' AND (storage.foldername(name))[1] = auth.uid()::TEXT
+    );
+
+DROP POLICY IF EXISTS "hazard_photos_delete_own" ON storage.objects;
+CREATE POLICY "hazard_photos_delete_own" ON storage.objects
+    FOR DELETE TO authenticated USING (
+        bucket_id = 'hazard-photos' AND (storage.foldername(name))[1] = auth.uid()::TEXT
+    );
+
+
+-- 7c. OPTIONAL: MONTHLY-PARTITIONED HAZARDS TABLE WITH ARCHIVAL
+-- =============================================================================
+-- For large deployments. Run once to convert hazards into a table
+-- partitioned by month on created_at:
+--
+--     SELECT partition_hazards_table();
+--
+-- Inserts (insert_hazard, insert_hazards) are routed to the right partition
+-- by Postgres; queries that bound created_at (get_hazards_within_radius with
+-- p_created_after, as the API calls it) only touch recent partitions, so
+-- vacuum, index size and planning stay proportional to recent data.
+-- The original table is kept as hazards_unpartitioned; drop it once the
+-- copy has been checked. Note the primary key becomes (id, created_at).
+-- These functions change or detach the hazards table, so no API role may
+-- execute them: run them as the table owner (SQL editor) or from pg_cron.
+
+-- Create monthly partitions from p_from's month through p_months_ahead
+-- months from now; a no-op while hazards is not partitioned
+CREATE OR REPLACE FUNCTION create_hazard_partitions(
+    p_months_ahead INT DEFAULT 3,
+    p_from DATE DEFAULT NULL
+)
+RETURNS INT AS $$
+DECLARE
+    v_month DATE := date_trunc('month', COALESCE(p_from, NOW()::DATE))::DATE;
+    v_last DATE := (date_trunc('month', NOW()) + make_interval(months => p_months_ahead))::DATE;
+    v_name TEXT;
+    v_created INT := 0;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'public.hazards'::regclass
+    ) THEN
+        RETURN 0;
+    END IF;
+    WHILE v_month <= v_last LOOP
+        v_name := 'hazards_' || to_char(v_month, 'YYYY_MM');
+        IF to_regclass('public.' || v_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE public.%I PARTITION OF public.hazards FOR VALUES FROM (%L) TO (%L)',
+                v_name, v_month, (v_month + INTERVAL '1 month')::DATE
+            );
+            v_created := v_created + 1;
+        END IF;
+        v_month := (v_month + INTERVAL '1 month')::DATE;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION create_hazard_partitions(INT, DATE) FROM PUBLIC, anon, authenticated;
+
+CREATE OR REPLACE FUNCTION partition_hazards_table()
+RETURNS VOID AS $$
+DECLARE
+    v_oldest DATE;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'public.hazards'::regclass
+    ) THEN
+        RAISE NOTICE 'hazards is already partitioned';
+        RETURN;
+    END IF;
+
+    LOCK TABLE hazards IN ACCESS EXCLUSIVE MODE;
+    DROP MATERIALIZED VIEW IF EXISTS hazard_statistics;
+    ALTER TABLE hazards RENAME TO hazards_unpartitioned;
+    ALTER INDEX IF EXISTS idx_hazards_location_gist RENAME TO idx_hazards_unpartitioned_location_gist;
+    ALTER INDEX IF EXISTS idx_hazards_driver_created_id RENAME TO idx_hazards_unpartitioned_driver_created_id;
+    ALTER INDEX IF EXISTS idx_hazards_severity RENAME TO idx_hazards_unpartitioned_severity;
+    ALTER INDEX IF EXISTS idx_hazards_type RENAME TO idx_hazards_unpartitioned_type;
+    ALTER INDEX IF EXISTS idx_hazards_created_at RENAME TO idx_hazards_unpartitioned_created_at;
+
+    CREATE TABLE hazards (
+        LIKE hazards_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+        PRIMARY KEY (id, created_at),
+        FOREIGN KEY (driver_id) REFERENCES drivers(id) ON DELETE CASCADE
+    ) PARTITION BY RANGE (created_at);
+
+    -- Catches rows outside every monthly partition
+    CREATE TABLE hazards_default PARTITION OF hazards DEFAULT;
+
+    SELECT date_trunc('month', MIN(created_at))::DATE INTO v_oldest FROM hazards_unpartitioned;
+    PERFORM create_hazard_partitions(3, v_oldest);
+
+    INSERT INTO hazards SELECT * FROM hazards_unpartitioned;
+
+    -- Same indexes as section 4; created on every partition
+    CREATE INDEX idx_hazards_location_gist ON hazards USING GIST(location) WHERE NOT expired;
+    CREATE INDEX idx_hazards_driver_created_id ON hazards(driver_id, created_at DESC, id DESC);
+    CREATE INDEX idx_hazards_severity ON hazards(severity_level);
+    CREATE INDEX idx_hazards_type ON hazards(hazard_type);
+    CREATE INDEX idx_hazards_created_at ON hazards(created_at DESC);
+
+    ALTER TABLE hazards ENABLE ROW LEVEL SECURITY;
+    CREATE POLICY "hazards_select_all" ON hazards
+        FOR SELECT USING (TRUE);
+    CREATE POLICY "hazards_insert_own" ON hazards
+        FOR INSERT WITH CHECK (auth.uid() = driver_id);
+
+    -- Same definition as section 7
+    CREATE MATERIALIZED VIEW hazard_statistics AS
+    SELECT
+        DATE_TRUNC('day', created_at)::DATE AS report_date,
+        hazard_type,
+        severity_level,
+        COUNT(*) AS total_count,
+        ROUND(AVG(confidence_score)::NUMERIC, 3) AS avg_confidence_score,
+        ROUND(MAX(confidence_score)::NUMERIC, 3) AS max_confidence_score
+    FROM hazards
+    GROUP BY report_date, hazard_type, severity_level;
+    CREATE INDEX idx_hazard_statistics_date ON hazard_statistics(report_date DESC);
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION partition_hazards_table() FROM PUBLIC, anon, authenticated;
+
+-- Detach monthly partitions that ended more than p_keep_months ago and move
+-- them to the hazards_archive schema. Their rows drop out of every hazards
+-- query (including driver history) but stay queryable there. Returns the
+-- names of the archived partitions.
+CREATE SCHEMA IF NOT EXISTS hazards_archive;
+
+CREATE OR REPLACE FUNCTION archive_hazard_partitions(
+    p_keep_months INT DEFAULT 12
+)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_cutoff DATE := (date_trunc('month', NOW()) - make_interval(months => p_keep_months))::DATE;
+    v_part RECORD;
+BEGIN
+    FOR v_part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.hazards'::regclass
+          AND c.relname ~ '^hazards_[0-9]{4}_[0-9]{2}$'
+          AND (to_date(substring(c.relname FROM 9), 'YYYY_MM') + INTERVAL '1 month')::DATE <= v_cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE public.hazards DETACH PARTITION public.%I', v_part.relname);
+        EXECUTE format('ALTER TABLE public.%I SET SCHEMA hazards_archive', v_part.relname);
+        RETURN NEXT v_part.relname;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION archive_hazard_partitions(INT) FROM PUBLIC, anon, authenticated;
+
+-- Monthly maintenance job: create upcoming partitions, archive old ones.
+-- Scheduled with pg_cron when that extension is enabled; otherwise run the
+-- two SELECTs once a month.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule(
+            'hazard-partition-maintenance',
+            '0 3 1 * *',
+            'SELECT create_hazard_partitions(3); SELECT archive_hazard_partitions(12);'
+        );
+    END IF;
+END;
+$$;
+
+
 -- 8. VERIFY SETUP
 -- =============================================================================
 -- Check all tables exist
@@ -226,5 +1293,11 @@ SELECT ST_Distance(
 
 -- Check functions exist
 SELECT proname FROM pg_proc 
-WHERE proname IN ('insert_hazard', 'get_hazards_within_radius')
+WHERE proname IN (
+    'insert_hazard', 'insert_hazards', 'merge_hazard_report',
+    'insert_hazard_dedup', 'insert_hazards_dedup', 'get_hazards_within_radius', 'get_hazards_along_route',
+    'get_hazards_near_points', 'count_hazards_near_points', 'upsert_driver_settings',
+    'expire_hazards', 'hazards_in_tile', 'get_hazard_tile',
+    'create_hazard_partitions', 'partition_hazards_table', 'archive_hazard_partitions'
+)
 AND pronamespace = (SELECT oid FROM pg_namespace WHERE nspname = 'public');
@@ -5,6 +5,7 @@ Run this before starting the backend to verify all dependencies and config.
 Usage: python verify_setup.py
 """
 
+import asyncio
 import sys
 from pathlib import Path
 
@@ -102,8 +103,15 @@ def check_supabase_connection():
         from app.database import SupabaseClient
         url = settings.supabase_url
         print(f"   URL: {url[:55]}{'...' if len(url) > 55 else ''}")
-        client = SupabaseClient.get_client()
-        client.table("drivers").select("id").limit(1).execute()
+
+        async def ping():
+            client = await SupabaseClient.connect()
+            try:
+                await client.table("drivers").select("id").limit(1).execute()
+            finally:
+                await SupabaseClient.close()
+
+        asyncio.run(ping())
         print("   ✅ PASS: Connected to Supabase\n")
         return True
     except Exception as e:
@@ -75,6 +75,18 @@ client.interceptors.response.use(
   }
 );
 
+/**
+ * Send the signed-in driver's Supabase access token with every request
+ * (required by PUT /settings). Pass null on sign-out.
+ */
+export function setAuthToken(token) {
+  if (token) {
+    client.defaults.headers.common.Authorization = `Bearer ${token}`;
+  } else {
+    delete client.defaults.headers.common.Authorization;
+  }
+}
+
 export const api = {
   /**
    * Get driver settings by driver ID